@@ -1,25 +1,111 @@
+from collections import deque
+
+# appended to the content of the initial message, many chat templates only accept a single leading system message
+SUMMARY_PREFIX = "\n\nSummary of the earlier conversation: "
+
+
+def approximate_token_count(text):
+    # ~4 characters per token for English text, used when no tokenizer is given
+    return len(text) // 4 + 1
+
+
 class Chat:
     """
     Handles the chat using to avoid OOM issues.
+    The history is bounded by a number of exchanges (size) and optionally by a number of tokens (max_tokens),
+    dropping the oldest messages first. Token counts are computed once, when a message is appended.
+    If keep_dropped is set, the dropped messages are kept for a ChatSummarizer to compress them into a summary,
+    which is appended to the initial message in the prompt.
     """
 
-    def __init__(self, size):
+    def __init__(
+        self, size, max_tokens=None, count_tokens=approximate_token_count, pin_init_chat=True, keep_dropped=False
+    ):
         self.size = size
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        # whether the initial message is kept whatever the token budget, otherwise it is the first to be left out
+        self.pin_init_chat = pin_init_chat
         self.init_chat_message = None
-        # maxlen is necessary pair, since a each new step we add an prompt and assitant answer
-        self.buffer = []
+        self.init_chat_tokens = 0
+        # the initial message isn't pinned and the history is over budget with it, it is left out of the prompt
+        self.init_chat_omitted = False
+        self.buffer = deque()
+        self.buffer_tokens = deque()
+        self.buffer_total_tokens = 0
+        self.keep_dropped = keep_dropped
+        self.dropped = []
+        self.summary = None
+        self.summary_tokens = 0
+
+    @property
+    def total_tokens(self):
+        init_chat_tokens = 0 if self.init_chat_omitted else self.init_chat_tokens
+        return init_chat_tokens + self.summary_tokens + self.buffer_total_tokens
 
     def append(self, item):
+        n_tokens = self.count_tokens(item["content"])
         self.buffer.append(item)
-        if len(self.buffer) == 2 * (self.size + 1):
-            self.buffer.pop(0)
-            self.buffer.pop(0)
+        self.buffer_tokens.append(n_tokens)
+        self.buffer_total_tokens += n_tokens
+        self.trim()
+
+    def pop_oldest(self):
+        self.buffer_total_tokens -= self.buffer_tokens.popleft()
+        message = self.buffer.popleft()
+        if self.keep_dropped:
+            self.dropped.append(message)
+        return message
+
+    def pop_last(self):
+        self.buffer_total_tokens -= self.buffer_tokens.pop()
+        return self.buffer.pop()
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, []
+        return dropped
+
+    def set_summary(self, summary):
+        self.summary_tokens = self.count_tokens(summary)
+        self.summary = summary
+
+    def trim(self):
+        # a new prompt was added to size exchanges, drop the oldest one
+        while self.size is not None and len(self.buffer) >= 2 * (self.size + 1):
+            self.pop_oldest()
+            self.pop_oldest()
+
+        if not self.max_tokens:
+            return
+        # the initial message comes back once the history fits the budget with it
+        self.init_chat_omitted = False
+        while self.total_tokens > self.max_tokens:
+            if self.init_chat_message is not None and not self.pin_init_chat and not self.init_chat_omitted:
+                self.init_chat_omitted = True
+            elif len(self.buffer) > 1:
+                # always keep the last message
+                self.pop_oldest()
+            else:
+                break
+        # the history starts with a user message
+        while len(self.buffer) > 1 and self.buffer[0]["role"] == "assistant":
+            self.pop_oldest()
 
     def init_chat(self, init_chat_message):
         self.init_chat_message = init_chat_message
+        self.init_chat_tokens = self.count_tokens(init_chat_message["content"]) if init_chat_message else 0
 
     def to_list(self):
-        if self.init_chat_message:
-            return [self.init_chat_message] + self.buffer
-        else:
-            return self.buffer
+        messages = list(self.buffer)
+        init_chat_message = self.init_chat_message if not self.init_chat_omitted else None
+        if self.summary:
+            if init_chat_message:
+                init_chat_message = {
+                    **init_chat_message,
+                    "content": init_chat_message["content"] + SUMMARY_PREFIX + self.summary,
+                }
+            else:
+                init_chat_message = {"role": "system", "content": SUMMARY_PREFIX.lstrip() + self.summary}
+        if init_chat_message:
+            messages.insert(0, init_chat_message)
+        return messages
@@ -0,0 +1,55 @@
+import logging
+from queue import Queue
+from threading import Thread
+
+logger = logging.getLogger(__name__)
+
+
+SUMMARY_INSTRUCTION = (
+    "Summarize the conversation below in a few sentences. Keep the facts, names, numbers and requests the assistant "
+    "needs to remember to continue it. Only answer with the summary."
+)
+
+
+class ChatSummarizer:
+    """
+    Compresses the messages dropped from a Chat into a running summary that replaces them in the prompt.
+    Summaries are generated in a background thread, one at a time, so that they stay off the critical path:
+    the chat keeps its previous summary until the new one is ready.
+    generate_summary takes a list of chat messages and returns the generated text.
+    """
+
+    def __init__(self, generate_summary):
+        self.generate_summary = generate_summary
+        self.queue = Queue()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, chat):
+        messages = chat.take_dropped()
+        if messages:
+            self.queue.put((chat, messages))
+
+    def build_prompt(self, summary, messages):
+        conversation = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if summary:
+            conversation = f"(earlier) {summary}\n{conversation}"
+        return [{"role": "user", "content": f"{SUMMARY_INSTRUCTION}\n\n{conversation}"}]
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            chat, messages = item
+            try:
+                summary = self.generate_summary(self.build_prompt(chat.summary, messages))
+            except Exception:
+                logger.exception("Failed to summarize the conversation, the dropped messages are lost.")
+                continue
+            chat.set_summary(summary)
+            logger.debug(f"summarized {len(messages)} messages: {summary}")
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+from collections import deque
+from time import monotonic, perf_counter
+
+import numpy as np
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+def parse_endpoints(endpoints):
+    """
+    Parses a comma-separated list of `model_name@base_url` endpoints ordered by preference,
+    e.g. "gpt-4o-mini@https://api.openai.com/v1,llama3.1:8b@http://localhost:11434/v1".
+    """
+    parsed = []
+    for endpoint in endpoints.split(","):
+        model_name, base_url = endpoint.strip().split("@", 1)
+        parsed.append((model_name.strip(), base_url.strip()))
+    return parsed
+
+
+class Endpoint:
+    """
+    An OpenAI-compatible endpoint with its recent first token latencies and a circuit breaker: after max_failures
+    consecutive errors or lost hedges, it isn't used for cooldown_s, then a single failure opens it again.
+    """
+
+    def __init__(self, model_name, base_url, client, max_failures=3, cooldown_s=30.0, window=100):
+        self.model_name = model_name
+        self.base_url = base_url
+        self.client = client
+        self.max_failures = max_failures
+        self.cooldown_s = cooldown_s
+        self.first_token_latencies = deque(maxlen=window)
+        self.failures = 0
+        self.open_until = 0.0
+        self.n_requests = 0
+        self.n_served = 0
+        self.n_errors = 0
+        self.n_slow = 0
+
+    @property
+    def name(self):
+        return f"{self.model_name}@{self.base_url}"
+
+    def is_available(self):
+        return monotonic() >= self.open_until
+
+    def hedge_deadline(self, percentile, default_s, min_samples=10):
+        """
+        Time (s) after which a request that has no first token yet is hedged, None to never hedge.
+        """
+        if percentile <= 0:
+            return None
+        if len(self.first_token_latencies) < min_samples:
+            return default_s
+        return float(np.percentile(self.first_token_latencies, percentile))
+
+    def record_success(self, first_token_latency):
+        self.first_token_latencies.append(first_token_latency)
+        self.failures = 0
+        self.n_served += 1
+
+    def record_failure(self, slow=False):
+        if slow:
+            self.n_slow += 1
+        else:
+            self.n_errors += 1
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self.open_until = monotonic() + self.cooldown_s
+            logger.warning(
+                f"{self.name}: {self.failures} consecutive {'slow responses' if slow else 'errors'}, "
+                f"not used for {self.cooldown_s:.0f} s"
+            )
+
+
+class Attempt:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.start = perf_counter()
+        self.ttfb = None
+        self.chunks = asyncio.Queue()  # text, then None or the raised exception
+        self.task = None
+
+
+class EndpointPool:
+    """
+    Sends chat completion requests to several OpenAI-compatible endpoints, with failover and hedging.
+    A request goes to the first available endpoint. If it has no first token after the hedge_percentile latency
+    of the most recently tried endpoint, a duplicate request is sent to the next one and the first to produce a token
+    is streamed, the others being cancelled. Erroring requests fail over to the next endpoint. At most max_attempts
+    requests are sent for a prompt, hedges and failovers included.
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        endpoints,
+        api_key=None,
+        http_client=None,
+        stream=True,
+        hedge_percentile=95,
+        hedge_delay_s=1.0,
+        max_attempts=2,
+        max_failures=3,
+        cooldown_s=30.0,
+    ):
+        self.endpoints = [
+            Endpoint(
+                model_name,
+                base_url,
+                AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client),
+                max_failures=max_failures,
+                cooldown_s=cooldown_s,
+            )
+            for model_name, base_url in endpoints
+        ]
+        self.stream = stream
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay_s = hedge_delay_s
+        self.max_attempts = max_attempts
+        # per request, from the start of the request to the response headers and to the first token
+        self.ttfbs = []
+        self.first_token_latencies = []
+
+    def candidates(self):
+        available = [endpoint for endpoint in self.endpoints if endpoint.is_available()]
+        if available:
+            return available
+        # all the circuits are open, try the endpoint that recovers first
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.open_until)
+
+    async def run_attempt(self, attempt, messages):
+        endpoint = attempt.endpoint
+        try:
+            response = await endpoint.client.chat.completions.create(
+                model=endpoint.model_name,
+                messages=messages,
+                stream=self.stream,
+            )
+            attempt.ttfb = perf_counter()
+            if not self.stream:
+                content = response.choices[0].message.content
+                if content:
+                    attempt.chunks.put_nowait(content)
+                attempt.chunks.put_nowait(None)
+                return
+
+            try:
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        attempt.chunks.put_nowait(chunk.choices[0].delta.content)
+            finally:
+                await response.close()
+            attempt.chunks.put_nowait(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"{endpoint.name}: {type(e).__name__}: {e}")
+            attempt.chunks.put_nowait(e)
+
+    async def wait_first_chunk(self, messages, attempts, start):
+        """
+        Launches attempts until one produces its first chunk, returns the winning attempt and this chunk.
+        """
+        candidates = self.candidates()
+        last_error = None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            endpoint.n_requests += 1
+            attempt = Attempt(endpoint)
+            attempt.task = asyncio.ensure_future(self.run_attempt(attempt, messages))
+            attempts.append(attempt)
+            return attempt
+
+        live = [launch()]
+        while True:
+            timeout = None
+            if candidates and len(attempts) < self.max_attempts:
+                # measured from the latest attempt, so that the hedges are spaced out
+                hedge_deadline = live[-1].endpoint.hedge_deadline(self.hedge_percentile, self.hedge_delay_s)
+                if hedge_deadline is not None:
+                    timeout = max(hedge_deadline - (perf_counter() - live[-1].start), 0)
+
+            getters = {asyncio.ensure_future(attempt.chunks.get()): attempt for attempt in live}
+            try:
+                done, pending = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for getter in getters:
+                    if not getter.done():
+                        getter.cancel()
+
+            if not done:
+                logger.debug(
+                    f"no first token from {live[-1].endpoint.name} after {perf_counter() - start:.3f} s, "
+                    f"hedging with {candidates[0].name}"
+                )
+                live.append(launch())
+                continue
+
+            winner = None
+            for getter in done:
+                attempt, chunk = getters[getter], getter.result()
+                if isinstance(chunk, Exception):
+                    attempt.endpoint.record_failure()
+                    live.remove(attempt)
+                    last_error = chunk
+                elif winner is None:
+                    winner = (attempt, chunk)
+            if winner is not None:
+                return winner
+
+            if not live:
+                if not candidates or len(attempts) >= self.max_attempts:
+                    raise last_error
+                logger.debug(f"failing over to {candidates[0].name}")
+                live.append(launch())
+
+    async def request(self, messages, text_queue):
+        """
+        Puts the generated text in text_queue as it arrives, then None, or the raised exception.
+        """
+        start = perf_counter()
+        attempts = []
+        try:
+            winner, chunk = await self.wait_first_chunk(messages, attempts, start)
+            now = perf_counter()
+            for attempt in attempts:
+                if attempt is not winner and not attempt.task.done():
+                    attempt.task.cancel()
+                    if attempt.start < winner.start:
+                        # overtaken by a hedge
+                        attempt.endpoint.record_failure(slow=True)
+            winner.endpoint.record_success(now - winner.start)
+            self.ttfbs.append(winner.ttfb - start)
+            self.first_token_latencies.append(now - start)
+
+            while chunk is not None:
+                if isinstance(chunk, Exception):
+                    winner.endpoint.record_failure()
+                    raise chunk
+                text_queue.put(chunk)
+                chunk = await winner.chunks.get()
+            text_queue.put(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            text_queue.put(e)
+        finally:
+            for attempt in attempts:
+                attempt.task.cancel()
+
+    async def warmup(self, messages):
+        """
+        Sends messages to every endpoint, which also opens the connections. Raises if none of them answers.
+        """
+        attempts = [Attempt(endpoint) for endpoint in self.endpoints]
+        await asyncio.gather(*(self.run_attempt(attempt, messages) for attempt in attempts))
+        errors = []
+        for attempt in attempts:
+            chunks = [attempt.chunks.get_nowait() for _ in range(attempt.chunks.qsize())]
+            if chunks and isinstance(chunks[-1], Exception):
+                attempt.endpoint.record_failure()
+                errors.append(chunks[-1])
+        if len(errors) == len(attempts):
+            raise errors[0]
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
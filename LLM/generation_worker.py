@@ -0,0 +1,109 @@
+import logging
+from contextlib import nullcontext
+from itertools import count
+from queue import PriorityQueue
+from threading import Event, Lock, Thread
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+logger = logging.getLogger(__name__)
+
+# requests of the turns go before the queued background requests, such as the summaries of the history,
+# and preempt the running ones
+TURN_PRIORITY = 0
+BACKGROUND_PRIORITY = 1
+
+
+class GenerationRequest:
+    def __init__(self, streamer, generate_kwargs):
+        self.streamer = streamer
+        self.generate_kwargs = generate_kwargs
+        self.output = None
+        self.error = None
+        # a background request stopped early for a turn, its output is incomplete
+        self.preempted = False
+        self.done = Event()
+
+
+class PreemptionCriteria(StoppingCriteria):
+    """
+    Stops a background generation as soon as a turn is waiting for the worker.
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.preempted = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.preempted = self.worker.pending_turns > 0
+        return torch.full((input_ids.shape[0],), self.preempted, dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationWorker:
+    """
+    Runs the generations of a model one after the other in a long-lived thread.
+    Each request gets its own streamer, so that the text of concurrent requests can't get mixed up.
+    Queued requests run by priority (lowest first), then in submission order. A running background request is
+    stopped at the next decoding step when a turn is submitted, so that turns never wait for background work:
+    it is returned with `preempted` set, for the caller to submit it again.
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.queue = PriorityQueue()
+        self.counter = count()
+        self.pending_turns = 0
+        self.lock = Lock()
+        # AssistedGenerationStats tracking the generations with an assistant model, if any
+        self.assisted_stats = None
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, priority=TURN_PRIORITY, **generate_kwargs):
+        """
+        Queues a model.generate call and returns its request: the generated text is read from request.streamer
+        and request.output is set once request.done is.
+        """
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        if priority >= BACKGROUND_PRIORITY:
+            preemption = PreemptionCriteria(self)
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [*generate_kwargs.get("stopping_criteria", []), preemption]
+            )
+        request = GenerationRequest(streamer, generate_kwargs)
+        if priority < BACKGROUND_PRIORITY:
+            with self.lock:
+                self.pending_turns += 1
+        self.queue.put((priority, next(self.counter), request))
+        return request
+
+    @torch.no_grad()
+    def run(self):
+        while True:
+            priority, _, request = self.queue.get()
+            if request is None:
+                break
+            if priority < BACKGROUND_PRIORITY:
+                with self.lock:
+                    self.pending_turns -= 1
+            tracking = nullcontext()
+            if self.assisted_stats is not None and request.generate_kwargs.get("assistant_model") is not None:
+                tracking = self.assisted_stats.track()
+            try:
+                with tracking:
+                    request.output = self.model.generate(**request.generate_kwargs, streamer=request.streamer)
+                if priority >= BACKGROUND_PRIORITY:
+                    request.preempted = request.generate_kwargs["stopping_criteria"][-1].preempted
+            except Exception as e:
+                logger.exception("Generation failed")
+                request.error = e
+                # unblock the reader
+                request.streamer.end()
+            request.done.set()
+
+    def stop(self):
+        # after the queued requests
+        self.queue.put((float("inf"), next(self.counter), None))
+        self.thread.join()
@@ -1,20 +1,28 @@
-from threading import Thread
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
-    pipeline,
-    TextIteratorStreamer,
+    DynamicCache,
+    StoppingCriteriaList,
 )
+import numpy as np
 import torch
+from collections import OrderedDict
+from time import perf_counter
 
-from LLM.chat import Chat
+from LLM.chat import SUMMARY_PREFIX, Chat
+from LLM.chat_summarizer import ChatSummarizer
+from LLM.generation_worker import BACKGROUND_PRIORITY, GenerationWorker
+from LLM.prefix_cache import PrefixKVCache, common_prefix_length
+from LLM.session_kv_pool import SessionKVPool
+from LLM.sentence_segmenter import SentenceSegmenter
+from LLM.speech_budget import SpeechBudget, SpeechBudgetCriteria
 from baseHandler import BaseHandler
 from rich.console import Console
 import logging
-from nltk import sent_tokenize
 
-#RAG
-from RAG.retrieval import RAGSystem
+from utils.assisted_generation import AssistedGenerationStats
+from utils.pipeline_events import PartialTranscript, SpeechStarted
+from utils.speaking_rate import SpeakingRate
 
 
 logger = logging.getLogger(__name__)
@@ -52,29 +60,73 @@ class LanguageModelHandler(BaseHandler):
         chat_size=1,
         init_chat_role=None,
         init_chat_prompt="You are a helpful AI assistant.",
+        first_clause_min_words=0,
+        max_speech_s=0,
+        speaking_rate=None,
+        cache_system_prompt=True,
+        session_kv_budget_mb=0,
+        session_kv_host_budget_mb=0,
+        max_sessions=64,
+        chat_max_tokens=0,
+        pin_init_chat=True,
+        summarize_history=False,
+        summary_max_new_tokens=96,
+        assistant_model_name=None,
+        compile_mode=None,
+        prompt_length_buckets="128,256,512,1024",
+        prefill_on_speech_start=False,
+        rag_top_k=0,
+        rag_timeout_s=0.5,
+        rag_backend="chroma",
     ):
         self.device = device
         self.torch_dtype = getattr(torch, torch_dtype)
+        self.compile_mode = compile_mode
+        self.prompt_length_buckets = sorted(int(bucket) for bucket in prompt_length_buckets.split(",") if bucket)
+
+        if self.compile_mode:
+            # these reuse or share KV caches between generate calls, which the static cache doesn't support
+            incompatible = {
+                "session_kv_budget_mb": session_kv_budget_mb,
+                "summarize_history": summarize_history,
+                "assistant_model_name": assistant_model_name,
+                "prefill_on_speech_start": prefill_on_speech_start,
+            }
+            enabled = [name for name, value in incompatible.items() if value]
+            if enabled:
+                logger.warning(
+                    f"{', '.join(enabled)} can't be used with the static cache required by torch compile, disabling them."
+                )
+            cache_system_prompt = False
+            session_kv_budget_mb = 0
+            summarize_history = False
+            assistant_model_name = None
+            prefill_on_speech_start = False
 
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModelForCausalLM.from_pretrained(
             model_name, torch_dtype=torch_dtype, trust_remote_code=True
         ).to(device)
-        self.pipe = pipeline(
-            "text-generation", model=self.model, tokenizer=self.tokenizer, device=device
-        )
-        self.streamer = TextIteratorStreamer(
-            self.tokenizer,
-            skip_prompt=True,
-            skip_special_tokens=True,
-        )
-        self.gen_kwargs = {
-            "streamer": self.streamer,
-            "return_full_text": False,
-            **gen_kwargs,
-        }
+        self.worker = GenerationWorker(self.model, self.tokenizer)
+        self.gen_kwargs = gen_kwargs
+
+        if self.compile_mode:
+            self.model.generation_config.cache_implementation = "static"
+            self.model.forward = torch.compile(
+                self.model.forward, mode=self.compile_mode, fullgraph=True
+            )
 
-        self.chat = Chat(chat_size)
+        self.assisted_stats = None
+        if assistant_model_name is not None:
+            self.load_assistant_model(assistant_model_name)
+
+        self.chat = Chat(
+            chat_size,
+            max_tokens=chat_max_tokens,
+            count_tokens=self.count_tokens,
+            pin_init_chat=pin_init_chat,
+            keep_dropped=summarize_history,
+        )
         if init_chat_role:
             if not init_chat_prompt:
                 raise ValueError(
@@ -82,21 +134,246 @@ class LanguageModelHandler(BaseHandler):
                 )
             self.chat.init_chat({"role": init_chat_role, "content": init_chat_prompt})
         self.user_role = user_role
+        # least recently used first, bounded by max_sessions
+        self.session_chats = OrderedDict()
+        self.max_sessions = max_sessions
+        self.segmenter = SentenceSegmenter(first_clause_min_words)
+        self.speech_budget = None
+        if max_speech_s > 0:
+            self.speech_budget = SpeechBudget(max_speech_s, speaking_rate or SpeakingRate())
+
+        self.prefix_cache = None
+        if cache_system_prompt and self.chat.init_chat_message:
+            self.prefix_cache = PrefixKVCache(self.model)
+            self.cache_system_prompt()
+
+        self.session_pool = None
+        if session_kv_budget_mb > 0:
+            self.session_pool = SessionKVPool(device, session_kv_budget_mb, session_kv_host_budget_mb)
+
+        # KV caches prefilled while the user is speaking, one per session, used by the next generation
+        self.prepared_pool = SessionKVPool(device, float("inf")) if prefill_on_speech_start else None
+
+        self.summary_max_new_tokens = summary_max_new_tokens
+        self.summarizer = ChatSummarizer(self.generate_summary) if summarize_history else None
+
+        self.retriever = None
+        if rag_top_k > 0:
+            try:
+                from RAG.retrieval import Retriever
+
+                self.retriever = Retriever(top_k=rag_top_k, timeout_s=rag_timeout_s, backend=rag_backend)
+                self.retriever.warmup()
+            except Exception as e:
+                logger.warning(f"The RAG retriever couldn't be loaded, prompts won't be augmented: {e}")
+                self.retriever = None
+        # per turn, the retrieval time, the time spent waiting for it and the time to first token
+        self.rag_latencies = []
 
         self.warmup()
 
+    def load_assistant_model(self, assistant_model_name):
+        if self.gen_kwargs.get("num_beams", 1) > 1:
+            raise ValueError("Assisted generation only supports greedy decoding or sampling, set `lm_gen_num_beams` to 1.")
+        # the draft model must share the main model's tokenizer (e.g. a smaller model of the same family)
+        self.assistant_model = AutoModelForCausalLM.from_pretrained(
+            assistant_model_name, torch_dtype=self.torch_dtype, trust_remote_code=True
+        ).to(self.device)
+        self.gen_kwargs = {**self.gen_kwargs, "assistant_model": self.assistant_model}
+        self.assisted_stats = AssistedGenerationStats(self.model, self.assistant_model, input_ids_key="input_ids")
+        self.worker.assisted_stats = self.assisted_stats
+
+    def get_chat(self, session_id):
+        if session_id is None:
+            return self.chat
+        if session_id in self.session_chats:
+            self.session_chats.move_to_end(session_id)
+        else:
+            chat = Chat(
+                self.chat.size,
+                max_tokens=self.chat.max_tokens,
+                count_tokens=self.count_tokens,
+                pin_init_chat=self.chat.pin_init_chat,
+                keep_dropped=self.chat.keep_dropped,
+            )
+            chat.init_chat(self.chat.init_chat_message)
+            self.session_chats[session_id] = chat
+            if len(self.session_chats) > self.max_sessions:
+                self.drop_session(next(iter(self.session_chats)))
+        return self.session_chats[session_id]
+
+    def drop_session(self, session_id):
+        """Forgets the history and the KV caches of the session."""
+        del self.session_chats[session_id]
+        for pool in (self.session_pool, self.prepared_pool):
+            if pool is not None:
+                pool.discard(session_id)
+        logger.debug(f"dropped the least recently used session {session_id}")
+
+    def count_tokens(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def cache_system_prompt(self):
+        system_ids = self.tokenizer.apply_chat_template(
+            [self.chat.init_chat_message], add_generation_prompt=False
+        )
+        turn_ids = self.tokenizer.apply_chat_template(
+            [self.chat.init_chat_message, {"role": self.user_role, "content": "Hello."}],
+            add_generation_prompt=True,
+        )
+        # the summary of the history, if any, is appended to the system prompt
+        summary_message = {
+            **self.chat.init_chat_message,
+            "content": self.chat.init_chat_message["content"] + SUMMARY_PREFIX,
+        }
+        summary_ids = self.tokenizer.apply_chat_template([summary_message], add_generation_prompt=False)
+        # some chat templates render the system prompt differently once other messages follow, only keep the common part
+        prefix_length = min(common_prefix_length(system_ids, turn_ids), common_prefix_length(system_ids, summary_ids))
+        if prefix_length == 0:
+            logger.warning("The system prompt isn't a prefix of the chat prompts, it won't be cached.")
+            return
+        self.prefix_cache.add(torch.tensor(turn_ids[:prefix_length], device=self.device))
+
+    def bucket_length(self, length):
+        for bucket in self.prompt_length_buckets:
+            if length <= bucket:
+                return bucket
+        # a multiple of the largest bucket, which will be compiled on first use
+        largest_bucket = self.prompt_length_buckets[-1]
+        return -(-length // largest_bucket) * largest_bucket
+
+    def pad_to_bucket(self, input_ids, pad_length=None):
+        """
+        Left pads the prompt to a bucket length, so that the compiled model only sees a few shapes.
+        """
+        pad_length = pad_length or self.bucket_length(input_ids.shape[-1])
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+        n_pad = pad_length - input_ids.shape[-1]
+        logger.debug(f"padding to {pad_length}")
+        padding = torch.full((1, n_pad), pad_token_id, dtype=input_ids.dtype, device=input_ids.device)
+        attention_mask = torch.cat([torch.zeros_like(padding), torch.ones_like(input_ids)], dim=-1)
+        return torch.cat([padding, input_ids], dim=-1), attention_mask
+
+    def generate(self, chat_messages, gen_kwargs, session_id=None, pad_length=None):
+        """
+        Queues the generation on the worker and returns its request, the generated text is read from request.streamer.
+        """
+        input_ids = self.tokenizer.apply_chat_template(
+            chat_messages, add_generation_prompt=True, return_tensors="pt"
+        ).to(self.device)
+        if self.compile_mode:
+            input_ids, attention_mask = self.pad_to_bucket(input_ids, pad_length)
+        if self.speech_budget is not None:
+            gen_kwargs = {
+                **gen_kwargs,
+                "stopping_criteria": StoppingCriteriaList(
+                    [SpeechBudgetCriteria(self.tokenizer, input_ids.shape[-1], self.speech_budget)]
+                ),
+            }
+        if self.compile_mode:
+            return self.worker.submit(
+                input_ids=input_ids, attention_mask=attention_mask, return_dict_in_generate=True, **gen_kwargs
+            )
+        past_key_values = self.get_cache(session_id, input_ids[0])
+        if past_key_values is not None:
+            logger.debug(
+                f"prefilling {input_ids.shape[-1] - past_key_values.get_seq_length()} of {input_ids.shape[-1]} prompt tokens"
+            )
+
+        return self.worker.submit(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=past_key_values,
+            return_dict_in_generate=True,
+            **gen_kwargs,
+        )
+
+    def get_cache(self, session_id, input_ids):
+        """
+        Returns the KV cache of the longest known prefix of input_ids (1D tensor of token ids): prefilled while the user
+        was speaking, kept from the previous turn of the session, or of the system prompt. Returns None if there is none.
+        """
+        for pool in (self.prepared_pool, self.session_pool):
+            if pool is not None:
+                cache, _ = pool.get(session_id, input_ids)
+                if cache is not None:
+                    return cache
+        if self.prefix_cache is not None:
+            return self.prefix_cache.get(input_ids)
+        return None
+
+    @torch.no_grad()
+    def prepare(self, event, session_id=None):
+        """
+        Prefills the conversation history, followed by the partial transcript if any, before the prompt arrives,
+        so that only its last tokens remain to prefill once the user is done speaking.
+        """
+        chat_messages = self.get_chat(session_id).to_list()
+        if isinstance(event, PartialTranscript) and event.text:
+            chat_messages = chat_messages + [{"role": self.user_role, "content": event.text}]
+        if not chat_messages:
+            return
+
+        input_ids = self.tokenizer.apply_chat_template(
+            chat_messages, add_generation_prompt=False, return_tensors="pt"
+        ).to(self.device)[0]
+        cache = self.get_cache(session_id, input_ids)
+        if cache is None:
+            cache = DynamicCache()
+        n_cached = cache.get_seq_length()
+        outputs = self.model(input_ids=input_ids[None, n_cached:], past_key_values=cache, use_cache=True)
+        self.prepared_pool.put(session_id, input_ids, outputs.past_key_values)
+        logger.debug(f"prefilled {input_ids.shape[-1] - n_cached} tokens ahead of the prompt")
+
+    def generate_summary(self, chat_messages):
+        """
+        Called from the summarizer thread. The generation is queued on the worker after the pending turns, and
+        stopped then restarted after them if a turn arrives meanwhile.
+        """
+        input_ids = self.tokenizer.apply_chat_template(
+            chat_messages, add_generation_prompt=True, return_tensors="pt"
+        ).to(self.device)
+        while True:
+            request = self.worker.submit(
+                priority=BACKGROUND_PRIORITY,
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=self.summary_max_new_tokens,
+                do_sample=False,
+            )
+            summary = "".join(request.streamer)
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            if not request.preempted:
+                return summary.strip()
+            logger.debug("summary preempted by a turn, restarting it")
+
     def warmup(self):
         logger.info(f"Warming up {self.__class__.__name__}")
 
         dummy_input_text = "Repeat the word 'home'."
-        dummy_chat = [{"role": self.user_role, "content": dummy_input_text}]
-        warmup_gen_kwargs = {
-            "min_new_tokens": self.gen_kwargs["min_new_tokens"],
-            "max_new_tokens": self.gen_kwargs["max_new_tokens"],
-            **self.gen_kwargs,
-        }
+        # goes through the cached system prompt, if any, like the actual turns
+        dummy_chat = self.chat.to_list() + [{"role": self.user_role, "content": dummy_input_text}]
+        if self.compile_mode not in (None, "default"):
+            # generating more tokens than during the warmup would trigger a new CUDA graphs capture
+            warmup_gen_kwargs = {
+                **self.gen_kwargs,
+                "min_new_tokens": self.gen_kwargs["max_new_tokens"],
+            }
+        else:
+            warmup_gen_kwargs = {
+                "min_new_tokens": self.gen_kwargs["min_new_tokens"],
+                "max_new_tokens": self.gen_kwargs["max_new_tokens"],
+                **self.gen_kwargs,
+            }
 
-        n_steps = 2
+        # 2 warmup steps for no compile or compile mode with CUDA graphs capture
+        n_steps = 1 if self.compile_mode == "default" else 2
+        # the largest bucket first, so that its static cache is reused by the smaller ones
+        pad_lengths = self.prompt_length_buckets[::-1] if self.compile_mode else [None]
 
         if self.device == "cuda":
             start_event = torch.cuda.Event(enable_timing=True)
@@ -104,13 +381,16 @@ class LanguageModelHandler(BaseHandler):
             torch.cuda.synchronize()
             start_event.record()
 
-        for _ in range(n_steps):
-            thread = Thread(
-                target=self.pipe, args=(dummy_chat,), kwargs=warmup_gen_kwargs
-            )
-            thread.start()
-            for _ in self.streamer:
-                pass
+        for pad_length in pad_lengths:
+            for _ in range(n_steps):
+                request = self.generate(dummy_chat, warmup_gen_kwargs, pad_length=pad_length)
+                for _ in request.streamer:
+                    pass
+                request.done.wait()
+            if pad_length is not None:
+                logger.info(f"Warmed up length {pad_length} tokens!")
+        if self.assisted_stats is not None:
+            self.assisted_stats.reset()
 
         if self.device == "cuda":
             end_event.record()
@@ -121,44 +401,127 @@ class LanguageModelHandler(BaseHandler):
             )
 
     def process(self, prompt):
+        if isinstance(prompt, (SpeechStarted, PartialTranscript)):
+            if self.prepared_pool is not None:
+                self.prepare(prompt)
+            return
+
         logger.debug("infering language model...")
         language_code = None
+        session_id = None
         if isinstance(prompt, tuple):
-            prompt, language_code = prompt
-            if language_code[-5:] == "-auto":
+            # (prompt, language_code) or (prompt, language_code, session_id)
+            if len(prompt) == 3:
+                prompt, language_code, session_id = prompt
+            else:
+                prompt, language_code = prompt
+            if language_code and language_code[-5:] == "-auto":
                 language_code = language_code[:-5]
                 prompt = f"Please reply to my message in {WHISPER_LANGUAGE_TO_LLM_LANGUAGE[language_code]}. " + prompt
 
-        self.chat.append({"role": self.user_role, "content": prompt})
+        turn_start = perf_counter()
+        # retrieve the documents while the prompt is prepared
+        retrieval = self.retriever.submit(prompt) if self.retriever is not None else None
+        if retrieval is not None and self.prepared_pool is not None:
+            # and prefill the history and the prompt, only the documents then remain to prefill
+            self.prepare(PartialTranscript(prompt), session_id)
 
-        # RAG retrieval
-        rag = RAGSystem()
-        documents = rag.retrieve(prompt)
-        if documents:
-            context = "\n\n".join([doc.page_content for doc in documents])
-            self.chat.append({"role": "system", "content": context})
+        chat = self.get_chat(session_id)
+        chat.append({"role": self.user_role, "content": prompt})
+        chat_messages = chat.to_list()
 
-        thread = Thread(
-            target=self.pipe, args=(self.chat.to_list(),), kwargs=self.gen_kwargs
-        )
-        thread.start()
+        retrieval_time = retrieval_wait = None
+        if retrieval is not None:
+            wait_start = perf_counter()
+            documents, retrieval_time = self.retriever.result(retrieval)
+            retrieval_wait = perf_counter() - wait_start
+            if documents:
+                # the documents are only used for this turn, they aren't kept in the history
+                context = "\n\n".join([doc.page_content for doc in documents])
+                chat_messages = chat_messages + [{"role": "system", "content": context}]
+
+        start = perf_counter()
+        request = self.generate(chat_messages, self.gen_kwargs, session_id)
+        generated_text = ""
+        for new_text in request.streamer:
+            if not generated_text and new_text and retrieval is not None:
+                self.log_rag_latency(retrieval_time, retrieval_wait, perf_counter() - turn_start)
+            generated_text += new_text
+            if self.device != "mps":
+                for sentence in self.segmenter.push(new_text):
+                    yield (sentence, language_code)
         if self.device == "mps":
-            generated_text = ""
-            for new_text in self.streamer:
-                generated_text += new_text
             printable_text = generated_text
             torch.mps.empty_cache()
         else:
-            generated_text, printable_text = "", ""
-            for new_text in self.streamer:
-                generated_text += new_text
-                printable_text += new_text
-                sentences = sent_tokenize(printable_text)
-                if len(sentences) > 1:
-                    yield (sentences[0], language_code)
-                    printable_text = new_text
+            printable_text = self.segmenter.flush()
 
-        self.chat.append({"role": "assistant", "content": generated_text})
+        request.done.wait()
+        if request.error is not None:
+            logger.error(
+                f"{self.__class__.__name__}: the generation failed: {type(request.error).__name__}: {request.error}"
+            )
+            if generated_text:
+                # the beginning of the reply was spoken
+                chat.append({"role": "assistant", "content": generated_text})
+            else:
+                chat.pop_last()
+            # even if empty, the TTS then listens again
+            yield (printable_text, language_code)
+            return
+
+        chat.append({"role": "assistant", "content": generated_text})
+        if self.assisted_stats is not None and request.output is not None:
+            elapsed = perf_counter() - start
+            new_tokens, acceptance_rate, speedup = self.assisted_stats.update(
+                request.output.sequences.shape[-1],
+                prompt_length=request.generate_kwargs["input_ids"].shape[-1],
+                elapsed=elapsed,
+            )
+            logger.debug(
+                f"assisted generation: {new_tokens} tokens in {elapsed:.3f} s ({new_tokens / elapsed:.1f} tokens/s), "
+                f"acceptance rate: {acceptance_rate:.2%}, tokens per main model forward: {speedup:.2f}"
+            )
+        if self.session_pool is not None and request.output is not None:
+            self.session_pool.put(session_id, request.output.sequences[0], request.output.past_key_values)
 
         # don't forget last sentence
         yield (printable_text, language_code)
+
+        # once the reply is sent, summarize the messages that fell out of the history
+        if self.summarizer is not None:
+            self.summarizer.submit(chat)
+
+    def log_rag_latency(self, retrieval_time, retrieval_wait, time_to_first_token):
+        self.rag_latencies.append((retrieval_time, retrieval_wait, time_to_first_token))
+        logger.debug(
+            f"retrieval: {retrieval_time if retrieval_time is not None else float('nan'):.3f} s, "
+            f"waited {retrieval_wait:.3f} s ({retrieval_wait / time_to_first_token:.1%} of the "
+            f"{time_to_first_token:.3f} s to the first token)"
+        )
+
+    def cleanup(self):
+        self.worker.stop()
+        if self.retriever is not None:
+            self.retriever.close()
+            if self.rag_latencies:
+                retrieval_times = [latency[0] for latency in self.rag_latencies if latency[0] is not None]
+                waits = sum(latency[1] for latency in self.rag_latencies)
+                time_to_first_token = sum(latency[2] for latency in self.rag_latencies)
+                logger.info(
+                    f"{self.__class__.__name__}: retrieval: {np.mean(retrieval_times) if retrieval_times else float('nan'):.3f} s mean, "
+                    f"waiting for it: {waits / time_to_first_token:.1%} of the time to first token"
+                )
+        if self.assisted_stats is not None:
+            self.assisted_stats.log_summary(self.__class__.__name__)
+        if self.summarizer is not None:
+            self.summarizer.stop()
+        if self.prefix_cache is not None:
+            logger.info(
+                f"{self.__class__.__name__}: system prompt KV cache hits: {self.prefix_cache.hits}, misses: {self.prefix_cache.misses}"
+            )
+        if self.session_pool is not None:
+            logger.info(
+                f"{self.__class__.__name__}: session KV cache hits: {self.session_pool.hits}, misses: {self.session_pool.misses}, "
+                f"moved to host: {self.session_pool.offloads}, dropped: {self.session_pool.evictions}"
+            )
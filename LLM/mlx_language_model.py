@@ -1,5 +1,9 @@
 import logging
 from LLM.chat import Chat
+from LLM.sentence_segmenter import SentenceSegmenter
+from LLM.speech_budget import SpeechBudget, SpeechBudgetTracker
+from utils.pipeline_events import PartialTranscript, SpeechStarted
+from utils.speaking_rate import SpeakingRate
 from baseHandler import BaseHandler
 from mlx_lm import load, stream_generate, generate
 from rich.console import Console
@@ -39,12 +43,22 @@ class MLXLanguageModelHandler(BaseHandler):
         chat_size=1,
         init_chat_role=None,
         init_chat_prompt="You are a helpful AI assistant.",
+        first_clause_min_words=0,
+        max_speech_s=0,
+        speaking_rate=None,
+        chat_max_tokens=0,
+        pin_init_chat=True,
     ):
         self.model_name = model_name
         self.model, self.tokenizer = load(self.model_name)
         self.gen_kwargs = gen_kwargs
 
-        self.chat = Chat(chat_size)
+        self.chat = Chat(
+            chat_size,
+            max_tokens=chat_max_tokens,
+            count_tokens=lambda text: len(self.tokenizer.encode(text, add_special_tokens=False)),
+            pin_init_chat=pin_init_chat,
+        )
         if init_chat_role:
             if not init_chat_prompt:
                 raise ValueError(
@@ -52,6 +66,10 @@ class MLXLanguageModelHandler(BaseHandler):
                 )
             self.chat.init_chat({"role": init_chat_role, "content": init_chat_prompt})
         self.user_role = user_role
+        self.segmenter = SentenceSegmenter(first_clause_min_words)
+        self.speech_budget = None
+        if max_speech_s > 0:
+            self.speech_budget = SpeechBudget(max_speech_s, speaking_rate or SpeakingRate())
 
         self.warmup()
 
@@ -74,6 +92,9 @@ class MLXLanguageModelHandler(BaseHandler):
             )
 
     def process(self, prompt):
+        if isinstance(prompt, (SpeechStarted, PartialTranscript)):
+            # only used by the transformers handler to prefill ahead of the prompt
+            return
         logger.debug("infering language model...")
         language_code = None
 
@@ -97,19 +118,25 @@ class MLXLanguageModelHandler(BaseHandler):
             chat_messages, tokenize=False, add_generation_prompt=True
         )
         output = ""
-        curr_output = ""
+        budget_tracker = SpeechBudgetTracker(self.speech_budget) if self.speech_budget is not None else None
         for t in stream_generate(
             self.model,
             self.tokenizer,
             prompt,
             max_tokens=self.gen_kwargs["max_new_tokens"],
         ):
-            output += t.text
-            curr_output += t.text
-            if curr_output.endswith((".", "?", "!", "<|end|>")):
-                yield (curr_output.replace("<|end|>", ""), language_code)
-                curr_output = ""
-        generated_text = output.replace("<|end|>", "")
+            new_text = t.text.replace("<|end|>", "")
+            output += new_text
+            for sentence in self.segmenter.push(new_text):
+                yield (sentence, language_code)
+            if budget_tracker is not None and budget_tracker.push(new_text):
+                break
+        generated_text = output
         torch.mps.empty_cache()
 
+        # don't forget last sentence
+        remaining_text = self.segmenter.flush()
+        if remaining_text:
+            yield (remaining_text, language_code)
+
         self.chat.append({"role": "assistant", "content": generated_text})
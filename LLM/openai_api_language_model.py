@@ -1,12 +1,20 @@
+import asyncio
 import logging
-import time
+from queue import Queue
+from threading import Thread
+from time import perf_counter
 
-from nltk import sent_tokenize
+import httpx
+import numpy as np
 from rich.console import Console
-from openai import OpenAI
 
 from baseHandler import BaseHandler
 from LLM.chat import Chat
+from LLM.endpoint_pool import EndpointPool, parse_endpoints
+from LLM.sentence_segmenter import SentenceSegmenter
+from LLM.speech_budget import SpeechBudget, SpeechBudgetTracker
+from utils.pipeline_events import PartialTranscript, SpeechStarted
+from utils.speaking_rate import SpeakingRate
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +31,12 @@ WHISPER_LANGUAGE_TO_LLM_LANGUAGE = {
 
 class OpenApiModelHandler(BaseHandler):
     """
-    Handles the language model part.
+    Handles the language model part through an OpenAI-compatible API.
+    Requests are sent by an async client running on its own event loop, whose HTTP connections are kept alive
+    between turns. Streamed text is passed back to the handler thread through a queue and sent to the TTS
+    sentence by sentence.
+    Several endpoints can be given as `model_name@base_url`: slow requests are hedged on the next endpoint and
+    erroring ones fail over to it (see EndpointPool).
     """
     def setup(
         self,
@@ -32,15 +45,28 @@ class OpenApiModelHandler(BaseHandler):
         gen_kwargs={},
         base_url =None,
         api_key=None,
-        stream=False,
+        stream=True,
         user_role="user",
         chat_size=1,
+        chat_max_tokens=0,
+        pin_init_chat=True,
         init_chat_role="system",
         init_chat_prompt="You are a helpful AI assistant.",
+        first_clause_min_words=0,
+        max_speech_s=0,
+        error_reply="Sorry, I can't answer right now. Please try again.",
+        max_connections=4,
+        endpoints=None,
+        hedge_percentile=95,
+        hedge_delay_s=1.0,
+        hedge_max_requests=2,
+        circuit_max_failures=3,
+        circuit_cooldown_s=30.0,
+        speaking_rate=None,
     ):
         self.model_name = model_name
         self.stream = stream
-        self.chat = Chat(chat_size)
+        self.chat = Chat(chat_size, max_tokens=chat_max_tokens, pin_init_chat=pin_init_chat)
         if init_chat_role:
             if not init_chat_prompt:
                 raise ValueError(
@@ -48,57 +74,124 @@ class OpenApiModelHandler(BaseHandler):
                 )
             self.chat.init_chat({"role": init_chat_role, "content": init_chat_prompt})
         self.user_role = user_role
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.segmenter = SentenceSegmenter(first_clause_min_words)
+        self.speech_budget = None
+        if max_speech_s > 0:
+            self.speech_budget = SpeechBudget(max_speech_s, speaking_rate or SpeakingRate())
+        self.error_reply = error_reply
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        self.pool = EndpointPool(
+            parse_endpoints(endpoints) if endpoints else [(model_name, base_url)],
+            api_key=api_key,
+            http_client=self.http_client,
+            stream=stream,
+            hedge_percentile=hedge_percentile,
+            hedge_delay_s=hedge_delay_s,
+            max_attempts=hedge_max_requests,
+            max_failures=circuit_max_failures,
+            cooldown_s=circuit_cooldown_s,
+        )
         self.warmup()
 
     def warmup(self):
         logger.info(f"Warming up {self.__class__.__name__}")
-        start = time.time()
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant"},
-                {"role": "user", "content": "Hello"},
-            ],
-            stream=self.stream
-        )
-        end = time.time()
+        start = perf_counter()
+        # also opens the connections that the first turns reuse
+        warmup_messages = [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": "Hello"},
+        ]
+        asyncio.run_coroutine_threadsafe(self.pool.warmup(warmup_messages), self.loop).result()
         logger.info(
-            f"{self.__class__.__name__}:  warmed up! time: {(end - start):.3f} s"
+            f"{self.__class__.__name__}:  warmed up! time: {(perf_counter() - start):.3f} s"
         )
+
+    def generate(self, messages):
+        """
+        Yields the generated text as it arrives. Closing the generator cancels the request.
+        """
+        text_queue = Queue()
+        future = asyncio.run_coroutine_threadsafe(self.pool.request(messages, text_queue), self.loop)
+        try:
+            while True:
+                new_text = text_queue.get()
+                if new_text is None:
+                    return
+                if isinstance(new_text, Exception):
+                    raise new_text
+                yield new_text
+        finally:
+            future.cancel()
+
     def process(self, prompt):
+            if isinstance(prompt, (SpeechStarted, PartialTranscript)):
+                # only used by the transformers handler to prefill ahead of the prompt
+                return
             logger.debug("call api language model...")
-            self.chat.append({"role": self.user_role, "content": prompt})
 
             language_code = None
             if isinstance(prompt, tuple):
-                prompt, language_code = prompt
-                if language_code[-5:] == "-auto":
+                prompt, language_code = prompt[:2]
+                if language_code and language_code[-5:] == "-auto":
                     language_code = language_code[:-5]
                     prompt = f"Please reply to my message in {WHISPER_LANGUAGE_TO_LLM_LANGUAGE[language_code]}. " + prompt
-            
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": self.user_role, "content": prompt},
-                ],
-                stream=self.stream
-            )
-            if self.stream:
-                generated_text, printable_text = "", ""
-                for chunk in response:
-                    new_text = chunk.choices[0].delta.content or ""
+            self.chat.append({"role": self.user_role, "content": prompt})
+
+            generated_text = ""
+            budget_tracker = SpeechBudgetTracker(self.speech_budget) if self.speech_budget is not None else None
+            text_stream = self.generate(self.chat.to_list())
+            try:
+                for new_text in text_stream:
+                    if not generated_text:
+                        logger.debug(
+                            f"time to first byte: {self.pool.ttfbs[-1]:.3f} s, "
+                            f"time to first token: {self.pool.first_token_latencies[-1]:.3f} s"
+                        )
                     generated_text += new_text
-                    printable_text += new_text
-                    sentences = sent_tokenize(printable_text)
-                    if len(sentences) > 1:
-                        yield sentences[0], language_code
-                        printable_text = new_text
-                self.chat.append({"role": "assistant", "content": generated_text})
-                # don't forget last sentence
-                yield printable_text, language_code
-            else:
-                generated_text = response.choices[0].message.content
-                self.chat.append({"role": "assistant", "content": generated_text})
-                yield generated_text, language_code
+                    for sentence in self.segmenter.push(new_text):
+                        yield sentence, language_code
+                    if budget_tracker is not None and budget_tracker.push(new_text):
+                        text_stream.close()
+                        break
+            except Exception as e:
+                # every endpoint failed, keep the pipeline running
+                logger.error(f"{self.__class__.__name__}: the request failed: {type(e).__name__}: {e}")
+                if generated_text:
+                    # the beginning of the reply was spoken
+                    self.chat.append({"role": "assistant", "content": generated_text})
+                else:
+                    self.chat.pop_last()
+                remaining_text = self.segmenter.flush()
+                if remaining_text:
+                    yield remaining_text, language_code
+                # even if empty, the TTS then listens again
+                yield self.error_reply, language_code
+                return
 
+            self.chat.append({"role": "assistant", "content": generated_text})
+            # don't forget last sentence
+            yield self.segmenter.flush(), language_code
+
+    def cleanup(self):
+        ttfbs = self.pool.ttfbs
+        if ttfbs:
+            logger.info(
+                f"{self.__class__.__name__}: {len(ttfbs)} requests, time to first byte: "
+                f"{np.mean(ttfbs):.3f} s mean, {np.percentile(ttfbs, 95):.3f} s p95"
+            )
+        if len(self.pool.endpoints) > 1:
+            for endpoint in self.pool.endpoints:
+                logger.info(
+                    f"{self.__class__.__name__}: {endpoint.name}: {endpoint.n_requests} requests, "
+                    f"{endpoint.n_served} served, {endpoint.n_errors} errors, {endpoint.n_slow} lost hedges"
+                )
+        asyncio.run_coroutine_threadsafe(self.pool.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
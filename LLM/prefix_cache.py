@@ -0,0 +1,66 @@
+import copy
+import logging
+from collections import OrderedDict
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class PrefixKVCache:
+    """
+    Keeps the KV cache of constant prompt prefixes, such as the system prompt, so that they are prefilled once and
+    shared by all the conversations starting with them. When generating, only the tokens following the longest
+    cached prefix of the prompt are prefilled.
+    """
+
+    def __init__(self, model, max_entries=4):
+        self.model = model
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @torch.no_grad()
+    def add(self, prefix_ids):
+        """
+        Prefills prefix_ids (1D tensor of token ids) and stores the resulting KV cache.
+        """
+        key = tuple(prefix_ids.tolist())
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        outputs = self.model(input_ids=prefix_ids[None], use_cache=True)
+        self.entries[key] = outputs.past_key_values
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        logger.debug(f"cached the KV of a {len(key)} tokens prefix")
+
+    def get(self, input_ids):
+        """
+        Returns a copy of the KV cache of the longest stored prefix of input_ids (1D tensor of token ids),
+        or None. At least one token is left to prefill, since generation needs the logits of the last one.
+        """
+        tokens = input_ids.tolist()
+        best_key = None
+        for key in self.entries:
+            if len(key) < len(tokens) and (best_key is None or len(key) > len(best_key)):
+                if tuple(tokens[: len(key)]) == key:
+                    best_key = key
+        if best_key is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(best_key)
+        # generation appends to the cache, keep the stored one untouched
+        return copy.deepcopy(self.entries[best_key])
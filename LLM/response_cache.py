@@ -0,0 +1,215 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+import torch
+from rich.console import Console
+from transformers import AutoModel, AutoTokenizer
+
+from baseHandler import BaseHandler
+from utils.pipeline_events import PartialTranscript, SpeechStarted
+
+logger = logging.getLogger(__name__)
+
+console = Console()
+
+
+class CachedResponse:
+    def __init__(self, prompt, language_code, embedding):
+        self.prompt = prompt
+        self.language_code = language_code
+        self.embedding = embedding
+        self.outputs = []  # sentences yielded by the language model
+        self.audio = {}  # sentence -> audio chunks rendered by the TTS
+        self.created = monotonic()
+        self.hits = 0
+
+
+class ResponseCache:
+    """
+    Responses of the language model and the audio the TTS rendered for them, indexed by the (normalized) embedding
+    of the prompt. Shared by the language model stage, which looks prompts up and records the sentences, and the
+    TTS stage, which records and replays the audio of these sentences.
+    Entries expire ttl_s after being created and the least recently used ones are evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries=256, ttl_s=3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.entries = OrderedDict()  # id -> CachedResponse
+        self.sentences = {}  # sentence -> CachedResponse, for the TTS
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def expire(self):
+        now = monotonic()
+        for key, entry in list(self.entries.items()):
+            if now - entry.created > self.ttl_s:
+                self.remove(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        for output in entry.outputs:
+            if self.sentences.get(output) is entry:
+                del self.sentences[output]
+
+    def lookup(self, embedding, language_code, similarity_threshold):
+        """
+        Returns the most similar cached response in the same language, if its cosine similarity is at least
+        similarity_threshold.
+        """
+        with self.lock:
+            self.expire()
+            candidates = [
+                (key, entry) for key, entry in self.entries.items() if entry.language_code == language_code
+            ]
+            best = None
+            if candidates:
+                similarities = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+                i = int(np.argmax(similarities))
+                if similarities[i] >= similarity_threshold:
+                    best = candidates[i]
+
+            if best is None:
+                self.misses += 1
+                return None
+            key, entry = best
+            self.hits += 1
+            entry.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def record_output(self, entry, output):
+        with self.lock:
+            entry.outputs.append(output)
+            self.sentences[output] = entry
+
+    def add(self, entry):
+        """
+        Makes a complete response available to lookups.
+        """
+        with self.lock:
+            self.entries[id(entry)] = entry
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+
+    def discard(self, entry):
+        with self.lock:
+            for output in entry.outputs:
+                if self.sentences.get(output) is entry:
+                    del self.sentences[output]
+
+    def synthesize(self, llm_sentence, audio_chunks, should_listen):
+        """
+        Yields the cached audio of llm_sentence if there is any, without consuming the audio_chunks generator of the
+        TTS. Otherwise yields audio_chunks and, if the sentence belongs to a cached response, records them.
+        """
+        try:
+            with self.lock:
+                entry = self.sentences.get(llm_sentence)
+                cached_chunks = entry.audio.get(llm_sentence) if entry is not None else None
+        except TypeError:  # unhashable
+            entry, cached_chunks = None, None
+
+        if cached_chunks is not None:
+            text = llm_sentence[0] if isinstance(llm_sentence, tuple) else llm_sentence
+            console.print(f"[green]ASSISTANT: {text}")
+            yield from cached_chunks
+            should_listen.set()
+            return
+
+        chunks = []
+        for audio_chunk in audio_chunks:
+            chunks.append(audio_chunk)
+            yield audio_chunk
+        if entry is not None:
+            with self.lock:
+                entry.audio[llm_sentence] = chunks
+
+    def most_hit(self, n=5):
+        with self.lock:
+            return sorted(self.entries.values(), key=lambda entry: entry.hits, reverse=True)[:n]
+
+
+class CachedLanguageModelHandler(BaseHandler):
+    """
+    Semantic cache in front of a language model handler, meant for stateless FAQ-style prompts
+    ("what are your opening hours?"). The prompt is embedded with a sentence embedding model: when a cached prompt in
+    the same language is at least similarity_threshold similar, its response is replayed without running the wrapped
+    model and the TTS replays the audio it rendered for it. Prompts shorter than min_words (e.g. "yes", "why?") depend
+    on the conversation and are neither looked up nor cached.
+    Cached replies are not added to the chat history of the wrapped handler.
+    """
+
+    def setup(
+        self,
+        handler,
+        cache,
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        device="cpu",
+        similarity_threshold=0.9,
+        min_words=3,
+    ):
+        self.handler = handler
+        self.cache = cache
+        self.device = device
+        self.similarity_threshold = similarity_threshold
+        self.min_words = min_words
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(device).eval()
+
+    @torch.no_grad()
+    def embed(self, text):
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True).to(self.device)
+        hidden_states = self.model(**inputs).last_hidden_state[0]
+        mask = inputs["attention_mask"][0].unsqueeze(-1).to(hidden_states.dtype)
+        embedding = (hidden_states * mask).sum(dim=0) / mask.sum()
+        embedding = torch.nn.functional.normalize(embedding, dim=-1)
+        return embedding.float().cpu().numpy()
+
+    def process(self, prompt):
+        if isinstance(prompt, (SpeechStarted, PartialTranscript)):
+            yield from self.handler.process(prompt)
+            return
+
+        text, language_code = prompt, None
+        if isinstance(prompt, tuple):
+            text, language_code = prompt[:2]
+        if len(text.split()) < self.min_words:
+            yield from self.handler.process(prompt)
+            return
+
+        embedding = self.embed(text.strip().lower())
+        entry = self.cache.lookup(embedding, language_code, self.similarity_threshold)
+        if entry is not None:
+            logger.debug(f'response cache hit for "{text}" (cached prompt: "{entry.prompt}", {entry.hits} hits)')
+            yield from entry.outputs
+            return
+
+        entry = CachedResponse(text, language_code, embedding)
+        for output in self.handler.process(prompt):
+            self.cache.record_output(entry, output)
+            yield output
+        if entry.outputs:
+            self.cache.add(entry)
+        else:
+            self.cache.discard(entry)
+
+    def cleanup(self):
+        logger.info(
+            f"{self.__class__.__name__}: {self.cache.hits} hits, {self.cache.misses} misses, "
+            f"hit rate: {self.cache.hit_rate:.2%}"
+        )
+        for entry in self.cache.most_hit():
+            if entry.hits:
+                logger.info(f'  {entry.hits} hits: "{entry.prompt}"')
+        self.handler.cleanup()
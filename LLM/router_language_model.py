@@ -0,0 +1,220 @@
+import logging
+import re
+from time import perf_counter
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from baseHandler import BaseHandler
+from utils.pipeline_events import PartialTranscript, SpeechStarted
+
+logger = logging.getLogger(__name__)
+
+# prompts that never need more than the smallest tier
+SIMPLE_PROMPTS = {
+    "hi",
+    "hello",
+    "hey",
+    "good morning",
+    "good afternoon",
+    "good evening",
+    "thanks",
+    "thank you",
+    "thank you very much",
+    "yes",
+    "yeah",
+    "yep",
+    "no",
+    "nope",
+    "ok",
+    "okay",
+    "sure",
+    "great",
+    "cool",
+    "got it",
+    "sounds good",
+    "bye",
+    "goodbye",
+    "see you",
+    "how are you",
+    "what's up",
+}
+
+REASONING_KEYWORDS = (
+    "why",
+    "explain",
+    "how does",
+    "how do",
+    "how can",
+    "how would",
+    "how to",
+    "what if",
+    "compare",
+    "difference",
+    "calculate",
+    "solve",
+    "prove",
+    "analyze",
+    "analyse",
+    "plan",
+    "step by step",
+    "pros and cons",
+    "summarize",
+    "translate",
+    "write",
+    "recommend",
+    "should i",
+)
+
+REASONING_PATTERN = re.compile(r"\b(" + "|".join(re.escape(keyword) for keyword in REASONING_KEYWORDS) + r")\b")
+ARITHMETIC_PATTERN = re.compile(r"\d+\s*[-+*/^%x]\s*\d+")
+
+
+def complexity_score(text):
+    """
+    Cheap estimate in [0, 1] of how much reasoning a prompt needs, from its length and keywords.
+    """
+    normalized = text.lower().strip(" .,!?")
+    if normalized in SIMPLE_PROMPTS:
+        return 0.0
+    words = re.findall(r"[\w']+", normalized)
+    score = 0.5 * min(len(words) / 30, 1.0)
+    if REASONING_PATTERN.search(normalized):
+        score += 0.4
+    if ARITHMETIC_PATTERN.search(normalized):
+        score += 0.4
+    if normalized.count("?") > 1:
+        score += 0.1
+    return min(score, 1.0)
+
+
+def parse_tiers(tiers):
+    """
+    Parses a comma-separated list of `tier=backend:model_name` tiers ordered by increasing capacity,
+    e.g. "small=transformers:HuggingFaceTB/SmolLM2-360M-Instruct,large=open_api:gpt-4o".
+    """
+    parsed = []
+    for tier in tiers.split(","):
+        name, spec = tier.strip().split("=", 1)
+        backend, model_name = spec.split(":", 1)
+        parsed.append((name.strip(), backend.strip(), model_name.strip()))
+    return parsed
+
+
+class RouterLanguageModelHandler(BaseHandler):
+    """
+    Routes each prompt to one of several language models (tiers) according to its complexity, so that greetings and
+    confirmations are answered by a small model and reasoning questions by a large one.
+    The complexity score is either the heuristic of `complexity_score` or, if classifier_model_name is set, the
+    probability of the last label of a sequence classification model. A prompt goes to the first tier whose
+    threshold is above its score. All the tiers are loaded at setup through `load_backend`, and the exchanges of
+    a tier are appended to the chat of the others so that they share the conversation.
+    """
+
+    def setup(
+        self,
+        load_backend,
+        tiers="small=transformers:HuggingFaceTB/SmolLM2-360M-Instruct,large=transformers:microsoft/Phi-3-mini-4k-instruct",
+        thresholds="0.4",
+        classifier_model_name=None,
+        classifier_device="cpu",
+        gen_kwargs={},
+    ):
+        self.tiers = parse_tiers(tiers)
+        self.thresholds = [float(threshold) for threshold in thresholds.split(",")]
+        if len(self.thresholds) != len(self.tiers) - 1:
+            raise ValueError(
+                f"{len(self.tiers)} tiers need {len(self.tiers) - 1} thresholds, got {len(self.thresholds)}."
+            )
+        if self.thresholds != sorted(self.thresholds):
+            raise ValueError("The thresholds should be increasing.")
+
+        self.backends = []
+        for name, backend, model_name in self.tiers:
+            logger.info(f"Loading {backend} LLM backend {model_name} for tier {name}")
+            self.backends.append(load_backend(backend, model_name))
+
+        self.classifier = None
+        if classifier_model_name is not None:
+            self.classifier_device = classifier_device
+            self.classifier_tokenizer = AutoTokenizer.from_pretrained(classifier_model_name)
+            self.classifier = (
+                AutoModelForSequenceClassification.from_pretrained(classifier_model_name).to(classifier_device).eval()
+            )
+
+        self.tier_counts = {name: 0 for name, _, _ in self.tiers}
+        self.tier_first_sentence_latencies = {name: [] for name, _, _ in self.tiers}
+        self.tier_latencies = {name: [] for name, _, _ in self.tiers}
+
+    @torch.no_grad()
+    def classifier_score(self, text):
+        inputs = self.classifier_tokenizer(text, return_tensors="pt", truncation=True).to(self.classifier_device)
+        logits = self.classifier(**inputs).logits[0]
+        return float(torch.softmax(logits.float(), dim=-1)[-1])
+
+    def score(self, text):
+        if self.classifier is not None:
+            return self.classifier_score(text)
+        return complexity_score(text)
+
+    def route(self, text):
+        start = perf_counter()
+        score = self.score(text)
+        tier = sum(score >= threshold for threshold in self.thresholds)
+        logger.debug(
+            f"routed to tier {self.tiers[tier][0]} (complexity {score:.2f}) in {(perf_counter() - start) * 1e3:.1f} ms"
+        )
+        return tier
+
+    def share_exchange(self, tier, prompt, session_id, reply):
+        for i, backend in enumerate(self.backends):
+            if i == tier:
+                continue
+            chat = backend.get_chat(session_id) if hasattr(backend, "get_chat") else getattr(backend, "chat", None)
+            if chat is None:
+                continue
+            chat.append({"role": backend.user_role, "content": prompt})
+            chat.append({"role": "assistant", "content": reply})
+
+    def process(self, prompt):
+        if isinstance(prompt, (SpeechStarted, PartialTranscript)):
+            for backend in self.backends:
+                yield from backend.process(prompt)
+            return
+
+        text, session_id = prompt, None
+        if isinstance(prompt, tuple):
+            text = prompt[0]
+            if len(prompt) == 3:
+                session_id = prompt[2]
+
+        tier = self.route(text)
+        name = self.tiers[tier][0]
+        self.tier_counts[name] += 1
+
+        start = perf_counter()
+        sentences = []
+        for output in self.backends[tier].process(prompt):
+            if not sentences:
+                self.tier_first_sentence_latencies[name].append(perf_counter() - start)
+            sentences.append(output[0] if isinstance(output, tuple) else output)
+            yield output
+        self.tier_latencies[name].append(perf_counter() - start)
+
+        self.share_exchange(tier, text, session_id, " ".join(sentence for sentence in sentences if sentence))
+
+    def cleanup(self):
+        for name, count in self.tier_counts.items():
+            if count == 0:
+                logger.info(f"{self.__class__.__name__}: tier {name}: 0 prompts")
+                continue
+            first_sentence_latencies = self.tier_first_sentence_latencies[name]
+            logger.info(
+                f"{self.__class__.__name__}: tier {name}: {count} prompts, "
+                f"first sentence: {np.mean(first_sentence_latencies):.3f} s mean, "
+                f"{np.percentile(first_sentence_latencies, 95):.3f} s p95, "
+                f"full response: {np.mean(self.tier_latencies[name]):.3f} s mean"
+            )
+        for backend in self.backends:
+            backend.cleanup()
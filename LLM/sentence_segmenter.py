@@ -0,0 +1,126 @@
+SENTENCE_TERMINATORS = ".!?"
+# CJK terminators end a sentence without being followed by a space
+CJK_SENTENCE_TERMINATORS = "。！？"
+CLAUSE_TERMINATORS = ",;:，；："
+CLOSING_PUNCTUATION = "\"')]}»”’"
+
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "a.m", "p.m", "u.s", "u.k", "fig", "approx", "inc", "ltd", "co", "mt", "ave",
+}
+# abbreviations only when a number follows ("No. 5"), otherwise words ending a sentence ("I said no.")
+NUMBER_ABBREVIATIONS = {"no", "nos"}
+
+
+class SentenceSegmenter:
+    """
+    Incrementally splits the text streamed by a language model into sentences, so that each of them can be sent
+    to the TTS as soon as it is complete. Only the newly pushed text is scanned, hence the cost per token stays constant.
+
+    A period ends a sentence when followed by whitespace, unless it follows an abbreviation, an initial or a list number,
+    so that decimals ("3.14"), abbreviations ("Dr. Smith") and enumerations ("1. First") are kept together.
+    If first_clause_min_words is set, the first segment of the response is emitted at the first clause boundary
+    (comma, semicolon, colon) once it has at least that many words, to start speaking earlier.
+    """
+
+    def __init__(self, first_clause_min_words=0, abbreviations=ABBREVIATIONS):
+        self.first_clause_min_words = first_clause_min_words
+        self.abbreviations = abbreviations
+        self.reset()
+
+    def reset(self):
+        self.text = ""
+        self.start = 0  # start of the current sentence
+        self.position = 0  # next character to scan
+        self.emitted = 0
+
+    def push(self, new_text):
+        """
+        Adds newly generated text and returns the sentences it completes.
+        """
+        self.text += new_text
+        sentences = []
+
+        while self.position < len(self.text):
+            char = self.text[self.position]
+            end = None
+
+            if char in CJK_SENTENCE_TERMINATORS:
+                end = self.position + 1
+            elif char in SENTENCE_TERMINATORS or (
+                self.emitted == 0 and self.first_clause_min_words and char in CLAUSE_TERMINATORS
+            ):
+                boundary = self.find_boundary(self.position)
+                if boundary is None:
+                    # wait for more text to decide
+                    break
+                end, is_sentence_end = boundary
+                if not is_sentence_end:
+                    self.position = end
+                    continue
+
+            if end is None:
+                self.position += 1
+                continue
+
+            sentence = self.text[self.start : end].strip()
+            self.position = end
+            if sentence:
+                sentences.append(sentence)
+                self.emitted += 1
+            self.start = end
+
+        # drop the emitted text, keeping the indices relative to the current sentence
+        if self.start:
+            self.text = self.text[self.start :]
+            self.position -= self.start
+            self.start = 0
+
+        return sentences
+
+    def find_boundary(self, index):
+        """
+        Returns the end of the punctuation starting with the terminator at index and whether it ends a sentence,
+        or None if more text is needed to decide.
+        """
+        end = index + 1
+        # ellipses, "?!", closing quotes and brackets belong to the sentence
+        while end < len(self.text) and (
+            self.text[end] in SENTENCE_TERMINATORS or self.text[end] in CLOSING_PUNCTUATION
+        ):
+            end += 1
+        if end == len(self.text):
+            return None
+        if not self.text[end].isspace():
+            return end, False
+
+        char = self.text[index]
+        if char in CLAUSE_TERMINATORS:
+            return end, len(self.text[self.start : index].split()) >= self.first_clause_min_words
+
+        if char == "." and end == index + 1:
+            words = self.text[self.start : index].split()
+            word = words[-1].lower() if words else ""
+            if word in self.abbreviations:
+                return end, False
+            if word in NUMBER_ABBREVIATIONS:
+                next_word = self.text[end:].lstrip()
+                if not next_word:
+                    return None
+                if next_word[0].isdigit():
+                    return end, False
+            # initials ("J. K. Rowling")
+            if len(word) == 1 and word.isalpha():
+                return end, False
+            # list numbers at the start of a sentence ("1. First")
+            if len(words) == 1 and word.isdigit():
+                return end, False
+        return end, True
+
+    def flush(self):
+        """
+        Returns the remaining text once the generation is over.
+        """
+        remaining = self.text[self.start :].strip()
+        self.reset()
+        return remaining
@@ -0,0 +1,105 @@
+import logging
+from collections import OrderedDict
+
+from LLM.prefix_cache import common_prefix_length
+
+logger = logging.getLogger(__name__)
+
+
+def cache_layers(cache):
+    """
+    Returns the (keys, values) tensors of each layer of a DynamicCache.
+    """
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers if layer.keys is not None]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def cache_tensors(cache):
+    return [t for layer in cache_layers(cache) for t in layer]
+
+
+def move_cache(cache, device):
+    if hasattr(cache, "layers"):
+        for layer in cache.layers:
+            if layer.keys is not None:
+                layer.keys = layer.keys.to(device, non_blocking=True)
+                layer.values = layer.values.to(device, non_blocking=True)
+    else:
+        cache.key_cache = [t.to(device, non_blocking=True) for t in cache.key_cache]
+        cache.value_cache = [t.to(device, non_blocking=True) for t in cache.value_cache]
+
+
+class SessionKVPool:
+    """
+    Keeps the KV cache of each session after its turn, so that the next turn only prefills the new messages.
+    When the caches kept on the device exceed device_budget_mb, the least recently used ones are moved to host memory,
+    and dropped when those exceed host_budget_mb. A cache is moved back to the device when its session speaks again.
+    """
+
+    def __init__(self, device, device_budget_mb, host_budget_mb=0):
+        self.device = device
+        self.device_budget = device_budget_mb * 2**20
+        self.host_budget = host_budget_mb * 2**20
+        # session_id -> [token_ids, cache, n_bytes, on_device]
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.offloads = 0
+        self.evictions = 0
+
+    def used_bytes(self, on_device):
+        return sum(entry[2] for entry in self.entries.values() if entry[3] == on_device)
+
+    def put(self, session_id, token_ids, cache):
+        """
+        Stores the cache of the session along with the token ids it was computed for, then enforces the budgets.
+        """
+        n_bytes = sum(t.numel() * t.element_size() for t in cache_tensors(cache))
+        self.entries[session_id] = [token_ids.tolist(), cache, n_bytes, True]
+        self.entries.move_to_end(session_id)
+
+        while self.used_bytes(True) > self.device_budget:
+            lru_session_id, entry = next((key, entry) for key, entry in self.entries.items() if entry[3])
+            if entry[2] > self.host_budget:
+                del self.entries[lru_session_id]
+                self.evictions += 1
+                continue
+            move_cache(entry[1], "cpu")
+            entry[3] = False
+            self.offloads += 1
+            logger.debug(f"moved the KV cache of session {lru_session_id} to host memory")
+
+        while self.used_bytes(False) > self.host_budget:
+            lru_session_id = next(key for key, entry in self.entries.items() if not entry[3])
+            del self.entries[lru_session_id]
+            self.evictions += 1
+            logger.debug(f"dropped the KV cache of session {lru_session_id}")
+
+    def discard(self, session_id):
+        self.entries.pop(session_id, None)
+
+    def get(self, session_id, input_ids):
+        """
+        Takes the cache of the session out of the pool, cropped to the tokens it shares with input_ids (1D tensor of
+        token ids), and returns it with its length. Returns (None, 0) if nothing can be reused.
+        """
+        entry = self.entries.pop(session_id, None)
+        if entry is None:
+            self.misses += 1
+            return None, 0
+        token_ids, cache, _, on_device = entry
+
+        # the history is re-tokenized from text and the oldest turns may have been dropped,
+        # only the common prefix is valid. At least one token is left to prefill.
+        tokens = input_ids.tolist()
+        prefix_length = min(common_prefix_length(token_ids, tokens), cache.get_seq_length(), len(tokens) - 1)
+        if prefix_length == 0:
+            self.misses += 1
+            return None, 0
+
+        self.hits += 1
+        if not on_device:
+            move_cache(cache, self.device)
+        cache.crop(prefix_length)
+        return cache, prefix_length
@@ -0,0 +1,77 @@
+import torch
+from transformers import StoppingCriteria
+
+from LLM.sentence_segmenter import CJK_SENTENCE_TERMINATORS, CLOSING_PUNCTUATION, SENTENCE_TERMINATORS
+
+
+class SpeechBudget:
+    """
+    Bounds a response by its duration once spoken rather than by its number of tokens, using the speaking rate
+    measured on the TTS. The response is over once the budget is spent and its last sentence is complete.
+    """
+
+    def __init__(self, max_speech_s, speaking_rate):
+        self.max_speech_s = max_speech_s
+        self.speaking_rate = speaking_rate
+
+    def is_spent(self, text, n_chars=None):
+        """
+        Whether the response is over. If n_chars, the number of characters of the response, is given, text only needs
+        to be its end.
+        """
+        if n_chars is None:
+            n_chars = len(text.strip())
+        if self.speaking_rate.chars_duration(n_chars) < self.max_speech_s:
+            return False
+        text = text.rstrip().rstrip(CLOSING_PUNCTUATION)
+        return text[-1:] in SENTENCE_TERMINATORS + CJK_SENTENCE_TERMINATORS
+
+
+class SpeechBudgetTracker:
+    """
+    Checks the SpeechBudget of a streamed response in constant time per chunk of text: only the number of
+    characters and the end of the response are kept.
+    """
+
+    def __init__(self, speech_budget, tail_chars=16):
+        self.speech_budget = speech_budget
+        self.tail_chars = tail_chars
+        self.n_chars = 0
+        self.tail = ""  # end of the response, enough to tell whether its last sentence is complete
+
+    def push(self, new_text):
+        """Adds the next chunk of the response, returns whether the response is over."""
+        if not self.n_chars:
+            new_text = new_text.lstrip()
+        self.n_chars += len(new_text)
+        self.tail = (self.tail + new_text)[-self.tail_chars :]
+        return self.speech_budget.is_spent(self.tail, n_chars=self.n_chars)
+
+
+class SpeechBudgetCriteria(StoppingCriteria):
+    """
+    Stops the generation once the SpeechBudget of the generated text (following prompt_length tokens) is spent.
+    The text is decoded incrementally: each step only decodes the tokens since the previous one, with a few tokens
+    of context for the tokenizers whose decoding depends on the preceding tokens (e.g. leading spaces).
+    """
+
+    def __init__(self, tokenizer, prompt_length, speech_budget, context_tokens=4, tail_chars=16):
+        self.tokenizer = tokenizer
+        self.tracker = SpeechBudgetTracker(speech_budget, tail_chars)
+        self.context_tokens = context_tokens
+        self.read_offset = prompt_length  # first token not decoded yet
+
+    def __call__(self, input_ids, scores, **kwargs):
+        prefix_offset = max(self.read_offset - self.context_tokens, 0)
+        tokens = input_ids[0, prefix_offset:].tolist()
+        n_context = self.read_offset - prefix_offset
+        prefix_text = self.tokenizer.decode(tokens[:n_context], skip_special_tokens=True)
+        text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+        # an incomplete multi-byte character is decoded with the next tokens
+        new_text = ""
+        if len(text) > len(prefix_text) and not text.endswith("\ufffd"):
+            new_text = text[len(prefix_text) :]
+            self.read_offset = input_ids.shape[-1]
+
+        is_done = self.tracker.push(new_text)
+        return torch.full((input_ids.shape[0],), is_done, dtype=torch.bool, device=input_ids.device)
@@ -32,7 +32,8 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.
 ALLOWED_EXTENSIONS = ["pdf", "docx", "txt"]
 
 # Vector Store Configuration
-VECTOR_STORE_DIR = os.path.join(DATA_DIR, "vector_store")\
+VECTOR_STORE_DIR = os.path.join(DATA_DIR, "vector_store")
+VECTOR_INDEX_DIR = os.path.join(DATA_DIR, "vector_index")
 
 USE_GPU = "true"
 
@@ -64,6 +65,7 @@ class Settings(BaseModel):
     data_dir: str = DATA_DIR
     allowed_extensions: List[str] = ALLOWED_EXTENSIONS
     vector_store_dir: str = VECTOR_STORE_DIR
+    vector_index_dir: str = VECTOR_INDEX_DIR
 
     # GPU Config
     use_gpu: bool = USE_GPU.lower() == "true"
@@ -7,13 +7,21 @@ import docx2txt
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from app.core.config import settings
+from RAG.config import settings
+from RAG.vector_index import MmapVectorStore
 
 class FileProcessor:
     """Utility class for processing different file types and creating vector stores."""
     
-    def __init__(self):
-        """Initialize the file processor with default text splitter and embeddings."""
+    def __init__(self, backend: str = "chroma"):
+        """
+        Initialize the file processor with default text splitter and embeddings.
+        The vector store backend is either "chroma" or "mmap" (memory-mapped IVF index, see RAG/vector_index.py).
+        """
+        if backend not in ("chroma", "mmap"):
+            raise ValueError(f"Unknown vector store backend: {backend}, should be 'chroma' or 'mmap'")
+        self.backend = backend
+        self.vector_store = None
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
@@ -22,7 +30,7 @@ class FileProcessor:
         # Using a lightweight embedding model that doesn't require GPU
         self.embeddings = HuggingFaceEmbeddings(
             model_name="Qwen3-Embedding-8B",
-            model_kwargs={'device': 'gpu' if settings.use_gpu else 'cpu'},
+            model_kwargs={'device': 'cuda' if settings.use_gpu else 'cpu'},
             encode_kwargs={'normalize_embeddings': True}
         )
         
@@ -83,6 +91,9 @@ class FileProcessor:
         metadatas = [{"source": file_path, "file_id": file_id} for _ in chunks]
         
         # Create or update the vector store
+        if self.backend == "mmap":
+            self.get_vector_store().add_texts(chunks, metadatas)
+            return file_id
         vector_store = Chroma.from_texts(
             texts=chunks,
             embedding=self.embeddings,
@@ -109,6 +120,11 @@ class FileProcessor:
     
     def get_vector_store(self):
         """Get the vector store for querying."""
+        if self.backend == "mmap":
+            # loaded once, it keeps a search thread
+            if self.vector_store is None:
+                self.vector_store = MmapVectorStore(settings.vector_index_dir, self.embeddings)
+            return self.vector_store
         return Chroma(
             persist_directory=settings.vector_store_dir,
             embedding_function=self.embeddings
@@ -1,10 +1,59 @@
-from langchain_deepseek import ChatDeepSeek
-from file_processor import FileProcessor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from time import perf_counter
+from RAG.file_processor import FileProcessor
 from typing import Optional, Dict, Any
 import logging
 
+class Retriever:
+    """
+    Keeps the embedding model and the vector store loaded across turns and retrieves documents in a background
+    thread, so that the caller can prepare the prompt meanwhile.
+    A retrieval slower than timeout_s is abandoned by the caller, the prompt is then used without documents.
+    """
+
+    def __init__(self, top_k: int = 3, timeout_s: float = 0.5, backend: str = "chroma"):
+        self.top_k = top_k
+        self.timeout_s = timeout_s
+        self.vector_store = FileProcessor(backend).get_vector_store()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retriever")
+        self.logger = logging.getLogger(__name__)
+
+    def retrieve(self, query: str) -> list:
+        return self.vector_store.similarity_search(query, k=self.top_k)
+
+    def warmup(self):
+        """Runs a first search, which loads the embedding model weights and the index."""
+        self.retrieve("warmup")
+
+    def _timed_retrieve(self, query: str):
+        start = perf_counter()
+        documents = self.retrieve(query)
+        return documents, perf_counter() - start
+
+    def submit(self, query: str):
+        """Starts retrieving the documents of query, returns a future for `result`."""
+        return self.executor.submit(self._timed_retrieve, query)
+
+    def result(self, future):
+        """Returns the retrieved documents and the retrieval time (s), or (None, None) on error or timeout."""
+        try:
+            return future.result(timeout=self.timeout_s)
+        except TimeoutError:
+            self.logger.warning(f"Retrieval took more than {self.timeout_s} s, answering without documents")
+        except Exception as e:
+            self.logger.error(f"Error retrieving documents: {e}")
+        return None, None
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if hasattr(self.vector_store, "close"):
+            self.vector_store.close()
+
+
 class RAGSystem:
     def __init__(self):
+        from langchain_deepseek import ChatDeepSeek
+
         self.model = ChatDeepSeek(
             model_name="deepseek/chat-7b",
             temperature=0.1,
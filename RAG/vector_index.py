@@ -0,0 +1,316 @@
+import json
+import os
+import shutil
+import uuid
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import List, Optional
+
+import numpy as np
+
+
+class Document:
+    """Retrieved chunk of text, with the same attributes as LangChain's documents."""
+
+    def __init__(self, page_content: str, metadata: Optional[dict] = None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+    def __repr__(self):
+        return f"Document(page_content={self.page_content[:40]!r}, metadata={self.metadata})"
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, sample_size=50000, seed=0):
+    """Centroids (unit norm) of the clusters of vectors by inner product, fitted on a sample of them."""
+    rng = np.random.default_rng(seed)
+    sample_ids = rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)
+    sample = np.asarray(vectors[np.sort(sample_ids)], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        new_centroids = np.zeros_like(centroids)
+        np.add.at(new_centroids, assignments, sample)
+        empty = np.flatnonzero(np.bincount(assignments, minlength=n_clusters) == 0)
+        # restart the empty clusters from random points
+        new_centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+        centroids = new_centroids / (np.linalg.norm(new_centroids, axis=1, keepdims=True) + 1e-12)
+    return centroids
+
+
+def assign(vectors, centroids, chunk_size=65536):
+    return np.concatenate(
+        [
+            np.argmax(np.asarray(vectors[start : start + chunk_size], dtype=np.float32) @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ]
+    )
+
+
+def top_k(scores, ids, k):
+    """Top k (scores, ids) of each row of scores, sorted by decreasing score."""
+    if scores.shape[1] > k:
+        partition = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, partition, axis=1)
+        ids = np.take_along_axis(ids, partition, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted file index over unit norm vectors, searched by inner product.
+    The vectors are clustered with spherical k-means and stored sorted by cluster in a .npy file which is memory-mapped,
+    so that loading the index only reads the centroids and a search only reads the clusters it probes.
+    Searches are batched: each cluster probed by a batch of queries is read once and scored against all of them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, path: str, vectors, n_lists: Optional[int] = None, dtype: str = "float16", n_iter: int = 10):
+        """Writes the index of vectors (n, dim) to path and loads it. Row i of vectors gets the id i."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            raise ValueError("Can't build an index without vectors")
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        centroids = spherical_kmeans(vectors, n_lists, n_iter=n_iter)
+        assignments = assign(vectors, centroids)
+        ids = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+
+        os.makedirs(path, exist_ok=True)
+        # written next to the current index then renamed, open memory maps keep reading the previous files
+        for name, array in (
+            ("vectors", vectors[ids].astype(dtype)),
+            ("ids", ids.astype(np.int64)),
+            ("centroids", centroids.astype(np.float32)),
+            ("offsets", offsets.astype(np.int64)),
+        ):
+            tmp_path = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+        return cls(path)
+
+    def vectors_by_id(self):
+        """All the vectors in id order, as float32."""
+        vectors = np.empty(self.vectors.shape, dtype=np.float32)
+        vectors[np.asarray(self.ids)] = self.vectors
+        return vectors
+
+    def search(self, queries, k: int = 4, n_probe: int = 8):
+        """
+        Returns the scores and ids (batch, k) of the k nearest vectors of each query (batch, dim), by inner product.
+        Missing results (fewer than k vectors in the probed clusters) have the id -1.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_probe = min(n_probe, self.n_lists)
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        # each probed cluster is read once (its pages only, the clusters are contiguous in the file)
+        # and scored against all the queries probing it with a single matrix product
+        for cluster in np.unique(probes):
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            rows = np.flatnonzero((probes == cluster).any(axis=1))
+            scores = queries[rows] @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            ids = np.broadcast_to(np.asarray(self.ids[start:end]), scores.shape)
+            best_scores[rows], best_ids[rows] = top_k(
+                np.concatenate([best_scores[rows], scores], axis=1),
+                np.concatenate([best_ids[rows], ids], axis=1),
+                k,
+            )
+        best_ids[~np.isfinite(best_scores)] = -1
+        return best_scores, best_ids
+
+
+class QueryBatcher:
+    """
+    Runs the searches submitted by concurrent callers in batches: the queries that arrive while a batch is searched
+    are searched together in the next one.
+    """
+
+    def __init__(self, search, max_batch_size: int = 32):
+        self.search = search
+        self.max_batch_size = max_batch_size
+        self.queue = Queue()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, query, k: int) -> Future:
+        future = Future()
+        self.queue.put((np.asarray(query, dtype=np.float32), k, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            if any(item is None for item in batch):
+                for item in batch:
+                    if item is not None:
+                        item[2].cancel()
+                return
+
+            try:
+                scores, ids = self.search(np.stack([query for query, _, _ in batch]), max(k for _, k, _ in batch))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for i, (_, k, future) in enumerate(batch):
+                future.set_result((scores[i, :k], ids[i, :k]))
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class Segment:
+    """IVFIndex of a batch of documents, stored with them in documents.jsonl (in id order) in the same directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = IVFIndex(path)
+        with open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as file:
+            self.documents = [Document(**json.loads(line)) for line in file]
+
+    def __len__(self):
+        return len(self.documents)
+
+    @classmethod
+    def build(cls, path: str, vectors, documents: List[Document], dtype: str = "float16"):
+        IVFIndex.build(path, vectors, dtype=dtype)
+        with open(os.path.join(path, "documents.jsonl"), "w", encoding="utf-8") as file:
+            for document in documents:
+                file.write(json.dumps({"page_content": document.page_content, "metadata": document.metadata}) + "\n")
+        return cls(path)
+
+
+class MmapVectorStore:
+    """
+    Vector store with the subset of the LangChain interface used by the RAG (add_texts, similarity_search), over
+    segments of IVFIndex. Each add_texts call indexes its texts in a new segment, without reading the existing ones;
+    the two newest segments are then merged while the older is at most twice as large, which keeps O(log n) segments
+    and rewrites each vector O(log n) times. segments.json lists the segments, it is replaced once they are written,
+    so that a failed add_texts leaves the store unchanged.
+    The embedding function must return unit norm embeddings (e.g. HuggingFaceEmbeddings with normalize_embeddings).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function,
+        n_probe: int = 8,
+        dtype: str = "float16",
+        max_batch_size: int = 32,
+    ):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.n_probe = n_probe
+        self.dtype = dtype
+        self.write_lock = Lock()  # serializes add_texts
+        # the ids of a segment follow those of the previous one, the list is replaced rather than modified
+        self.segments = []
+        manifest_path = os.path.join(path, "segments.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as file:
+                self.segments = [Segment(os.path.join(path, name)) for name in json.load(file)["segments"]]
+        # by id, only appended to: merging consecutive segments keeps the ids
+        self.documents = [document for segment in self.segments for document in segment.documents]
+        self.batcher = QueryBatcher(self.search_vectors, max_batch_size)
+
+    def search_vectors(self, queries, k):
+        segments = self.segments
+        results = []
+        start = 0
+        for segment in segments:
+            scores, ids = segment.index.search(queries, k=k, n_probe=self.n_probe)
+            results.append((scores, np.where(ids >= 0, ids + start, -1)))
+            start += len(segment)
+        scores = np.concatenate([scores for scores, _ in results], axis=1)
+        ids = np.concatenate([ids for _, ids in results], axis=1)
+        return top_k(scores, ids, k)
+
+    def build_segment(self, vectors, documents):
+        path = os.path.join(self.path, f"segment-{uuid.uuid4().hex}")
+        return Segment.build(path, vectors, documents, dtype=self.dtype)
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None):
+        """Embeds texts and indexes them in a new segment."""
+        texts = list(texts)
+        if not texts:
+            return
+        metadatas = metadatas or [{} for _ in texts]
+        embeddings = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        documents = [Document(text, metadata) for text, metadata in zip(texts, metadatas)]
+
+        with self.write_lock:
+            os.makedirs(self.path, exist_ok=True)
+            segments = list(self.segments)
+            built = []
+            try:
+                new_segment = self.build_segment(embeddings, documents)
+                built.append(new_segment)
+                while segments and len(segments[-1]) <= 2 * len(new_segment):
+                    # only the two merged segments are read
+                    previous = segments.pop()
+                    new_segment = self.build_segment(
+                        np.concatenate([previous.index.vectors_by_id(), new_segment.index.vectors_by_id()]),
+                        previous.documents + new_segment.documents,
+                    )
+                    built.append(new_segment)
+                segments.append(new_segment)
+
+                manifest_path = os.path.join(self.path, "segments.json")
+                with open(manifest_path + ".tmp", "w", encoding="utf-8") as file:
+                    json.dump({"segments": [os.path.basename(segment.path) for segment in segments]}, file)
+                os.replace(manifest_path + ".tmp", manifest_path)
+            except Exception:
+                for segment in built:
+                    shutil.rmtree(segment.path, ignore_errors=True)
+                raise
+
+            removed = [segment for segment in self.segments + built if segment not in segments]
+            # the documents are added before they can be found
+            self.documents.extend(documents)
+            self.segments = segments
+            # open memory maps keep reading the deleted files
+            for segment in removed:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        if not self.segments:
+            return []
+        embedding = self.embedding_function.embed_query(query)
+        _, ids = self.batcher.submit(embedding, k).result()
+        return [self.documents[i] for i in ids if i >= 0]
+
+    def persist(self):
+        # written on every add_texts, kept for compatibility with Chroma
+        pass
+
+    def close(self):
+        self.batcher.stop()
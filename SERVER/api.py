@@ -91,9 +91,15 @@ def create_pipeline_with_deepseek_config():
             whisper_stt_handler_kwargs,
             paraformer_stt_handler_kwargs,
             faster_whisper_stt_handler_kwargs,
+            moonshine_stt_handler_kwargs,
+            stt_cache_kwargs,
+            cascade_stt_handler_kwargs,
+            router_stt_handler_kwargs,
             language_model_handler_kwargs,
             open_api_language_model_handler_kwargs,
             mlx_language_model_handler_kwargs,
+            router_lm_kwargs,
+            response_cache_kwargs,
             parler_tts_handler_kwargs,
             melo_tts_handler_kwargs,
             chat_tts_handler_kwargs,
@@ -106,9 +112,15 @@ def create_pipeline_with_deepseek_config():
             whisper_stt_handler_kwargs,
             paraformer_stt_handler_kwargs,
             faster_whisper_stt_handler_kwargs,
+            moonshine_stt_handler_kwargs,
+            stt_cache_kwargs,
+            cascade_stt_handler_kwargs,
+            router_stt_handler_kwargs,
             language_model_handler_kwargs,
             open_api_language_model_handler_kwargs,
             mlx_language_model_handler_kwargs,
+            router_lm_kwargs,
+            response_cache_kwargs,
             parler_tts_handler_kwargs,
             melo_tts_handler_kwargs,
             chat_tts_handler_kwargs,
@@ -127,9 +139,15 @@ def create_pipeline_with_deepseek_config():
             whisper_stt_handler_kwargs,
             faster_whisper_stt_handler_kwargs,
             paraformer_stt_handler_kwargs,
+            moonshine_stt_handler_kwargs,
+            stt_cache_kwargs,
+            cascade_stt_handler_kwargs,
+            router_stt_handler_kwargs,
             language_model_handler_kwargs,
             open_api_language_model_handler_kwargs,
             mlx_language_model_handler_kwargs,
+            router_lm_kwargs,
+            response_cache_kwargs,
             parler_tts_handler_kwargs,
             melo_tts_handler_kwargs,
             chat_tts_handler_kwargs,
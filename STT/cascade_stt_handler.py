@@ -0,0 +1,98 @@
+import logging
+from time import perf_counter
+
+from rich.console import Console
+
+from baseHandler import BaseHandler
+
+logger = logging.getLogger(__name__)
+
+console = Console()
+
+
+class CascadeSTTHandler(BaseHandler):
+    """
+    Runs a fast faster-whisper model first and only hands the spoken prompt over to the accurate STT handler
+    when the fast transcription is not confident enough, i.e. when its average log probability is below logprob_threshold.
+    As in Whisper, a prompt with a no speech probability above no_speech_threshold and a low average log probability is
+    considered silent and skipped.
+    """
+
+    def setup(
+        self,
+        fast_handler,
+        accurate_handler,
+        logprob_threshold=-0.5,
+        no_speech_threshold=0.6,
+        gen_kwargs={},
+    ):
+        self.fast_handler = fast_handler
+        self.accurate_handler = accurate_handler
+        self.logprob_threshold = logprob_threshold
+        self.no_speech_threshold = no_speech_threshold
+
+        self.tier_counts = {"fast": 0, "accurate": 0, "no_speech": 0}
+        self.tier_times = {"fast": 0.0, "accurate": 0.0, "no_speech": 0.0}
+        self.escalation_times = 0.0
+
+    def process(self, spoken_prompt):
+        logger.debug("infering fast tier of the STT cascade...")
+
+        start = perf_counter()
+        pred_text, avg_logprob, no_speech_prob, _ = self.fast_handler.transcribe(spoken_prompt)
+        fast_time = perf_counter() - start
+        logger.debug(
+            f"fast tier: avg logprob {avg_logprob:.3f}, no speech prob {no_speech_prob:.3f}, {fast_time:.3f} s"
+        )
+
+        if avg_logprob < self.logprob_threshold and no_speech_prob > self.no_speech_threshold:
+            self.record("no_speech", fast_time)
+            logger.debug("no speech detected. skipping...")
+            return
+
+        if avg_logprob >= self.logprob_threshold:
+            self.record("fast", fast_time)
+            if pred_text:
+                console.print(f"[yellow]USER: {pred_text}")
+                yield pred_text
+            else:
+                logger.debug("no text detected. skipping...")
+            return
+
+        logger.debug("low confidence, escalating to the accurate tier...")
+        start = perf_counter()
+        yield from self.accurate_handler.process(spoken_prompt)
+        accurate_time = perf_counter() - start
+        self.escalation_times += fast_time
+        self.record("accurate", accurate_time)
+
+    def record(self, tier, elapsed):
+        self.tier_counts[tier] += 1
+        self.tier_times[tier] += elapsed
+        logger.debug(self.routing_summary())
+
+    def routing_summary(self):
+        total = sum(self.tier_counts.values())
+        summary = ", ".join(
+            f"{tier}: {count} ({self.tier_times[tier] / count:.3f} s avg)" if count else f"{tier}: 0"
+            for tier, count in self.tier_counts.items()
+        )
+
+        # latency saved compared to running the accurate tier on every prompt,
+        # taking into account the time lost on the fast tier for escalated prompts
+        if self.tier_counts["accurate"]:
+            accurate_avg = self.tier_times["accurate"] / self.tier_counts["accurate"]
+            answered_by_fast = self.tier_counts["fast"] + self.tier_counts["no_speech"]
+            saved = (
+                answered_by_fast * accurate_avg
+                - self.tier_times["fast"]
+                - self.tier_times["no_speech"]
+                - self.escalation_times
+            )
+            summary += f", avg latency saved: {saved / total:.3f} s"
+        return f"STT cascade routing over {total} prompts: {summary}"
+
+    def cleanup(self):
+        logger.info(self.routing_summary())
+        self.fast_handler.cleanup()
+        self.accurate_handler.cleanup()
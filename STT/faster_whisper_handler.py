@@ -3,6 +3,10 @@ import os
 from time import perf_counter
 
 from faster_whisper import WhisperModel
+try:
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:  # faster-whisper < 1.1
+    BatchedInferencePipeline = None
 from rich.console import Console
 
 from baseHandler import BaseHandler
@@ -22,29 +26,60 @@ class FasterWhisperSTTHandler(BaseHandler):
         model_name: str = "tiny.en",
         device: str = "auto",
         compute_type: str = "auto",
+        batch_size: int = 8,
         gen_kwargs={},
     ):
         self.gen_kwargs = self.adapt_gen_kwargs(gen_kwargs)
+        self.batch_size = batch_size
 
         os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
         self.model = WhisperModel(model_name, device=device, compute_type=compute_type)
 
-    def process(self, audio):
-        logger.debug("infering faster whisper...")
-
-        global pipeline_start
-        pipeline_start = perf_counter()
-
-        segments, info = self.model.transcribe(audio, **self.gen_kwargs)
+        # prompts longer than Whisper's 30 s window are otherwise transcribed window after window
+        self.batched_model = None
+        if batch_size > 1:
+            if BatchedInferencePipeline is None:
+                logger.warning("Batched transcription of long prompts requires faster-whisper >= 1.1.")
+            else:
+                self.batched_model = BatchedInferencePipeline(model=self.model)
+
+    def transcribe(self, audio):
+        """
+        Transcribes the audio and returns the text along with the confidence reported by faster-whisper:
+        the average log probability of the generated tokens and the probability of the audio containing no speech.
+        """
+        if self.batched_model is not None and len(audio) > 30 * 16000:
+            segments, info = self.batched_model.transcribe(
+                audio, batch_size=self.batch_size, **self.gen_kwargs
+            )
+        else:
+            segments, info = self.model.transcribe(audio, **self.gen_kwargs)
         output_text = []
+        sum_logprob, n_tokens = 0.0, 0
+        no_speech_prob = 1.0
 
-        for segment in segments:
+        for i, segment in enumerate(segments):
             logger.debug(
                 "[%.2fs -> %.2fs] %s" % (segment.start, segment.end, segment.text)
             )
             output_text.append(segment.text)
+            sum_logprob += segment.avg_logprob * len(segment.tokens)
+            n_tokens += len(segment.tokens)
+            if i == 0:
+                no_speech_prob = segment.no_speech_prob
 
         pred_text = " ".join(output_text).strip()
+        avg_logprob = sum_logprob / n_tokens if n_tokens else 0.0
+
+        return pred_text, avg_logprob, no_speech_prob, info.language
+
+    def process(self, audio):
+        logger.debug("infering faster whisper...")
+
+        global pipeline_start
+        pipeline_start = perf_counter()
+
+        pred_text, _, _, _ = self.transcribe(audio)
 
         logger.debug("finished whisper inference")
         if pred_text:
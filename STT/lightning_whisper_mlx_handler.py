@@ -39,8 +39,15 @@ class LightningWhisperSTTHandler(BaseHandler):
         torch_dtype="float16",
         compile_mode=None,
         language=None,
+        assistant_model_name=None,
+        assistant_shares_encoder=True,
+        long_form_chunking=True,
+        chunk_overlap_s=1.0,
+        quantize=None,
         gen_kwargs={},
     ):
+        if assistant_model_name is not None:
+            logger.warning(f"Speculative decoding is not supported by {self.__class__.__name__}, ignoring the assistant model.")
         if len(model_name.split("/")) > 1:
             model_name = model_name.split("/")[-1]
         self.device = device
@@ -0,0 +1,63 @@
+import string
+
+import numpy as np
+
+
+def split_long_audio(
+    audio,
+    sample_rate=16000,
+    chunk_length_s=30.0,
+    overlap_s=1.0,
+    search_s=3.0,
+    frame_ms=20,
+):
+    """
+    Splits audio longer than chunk_length_s into overlapping windows so that they can be transcribed as one batch.
+    Each window ends at the lowest energy frame of its last search_s seconds, so that cuts fall between words
+    whenever possible, and the next window starts overlap_s seconds before the cut.
+    """
+    max_length = int(chunk_length_s * sample_rate)
+    if len(audio) <= max_length:
+        return [audio]
+    if search_s + overlap_s >= chunk_length_s:
+        raise ValueError("search_s + overlap_s should be smaller than chunk_length_s.")
+
+    overlap = int(overlap_s * sample_rate)
+    search = int(search_s * sample_rate)
+    frame = int(frame_ms * sample_rate / 1000)
+
+    chunks = []
+    start = 0
+    while start + max_length < len(audio):
+        search_start = start + max_length - search
+        window = audio[search_start : start + max_length]
+        n_frames = len(window) // frame
+        energy = np.square(window[: n_frames * frame].reshape(n_frames, frame)).mean(axis=1)
+        cut = search_start + int(np.argmin(energy)) * frame + frame // 2
+        chunks.append(audio[start:cut])
+        start = cut - overlap
+    chunks.append(audio[start:])
+    return chunks
+
+
+def _normalize(word):
+    return word.lower().strip(string.punctuation)
+
+
+def merge_transcripts(texts, max_overlap_words=15):
+    """
+    Concatenates the transcripts of consecutive overlapping windows, dropping the words of each transcript
+    that repeat the end of the previous one (the longest matching overlap, ignoring case and punctuation).
+    """
+    merged = []
+    for text in texts:
+        words = text.split()
+        if merged and words:
+            tail = [_normalize(word) for word in merged[-max_overlap_words:]]
+            head = [_normalize(word) for word in words[:max_overlap_words]]
+            for k in range(min(len(tail), len(head)), 0, -1):
+                if tail[-k:] == head[:k]:
+                    words = words[k:]
+                    break
+        merged.extend(words)
+    return " ".join(merged)
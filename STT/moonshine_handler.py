@@ -1,8 +1,10 @@
 import os
 os.environ['KERAS_BACKEND'] = 'torch'
 
+from queue import Empty
 from time import perf_counter
 import moonshine
+import numpy as np
 import torch
 from baseHandler import BaseHandler
 from rich.console import Console
@@ -15,39 +17,82 @@ console = Console()
 class MoonshineSTTHandler(BaseHandler):
     """
     Handles the Speech To Text generation using a Moonshine model.
+    Spoken prompts are zero-padded to a small set of lengths (length_buckets_s) so that the model always sees the same
+    shapes, and prompts waiting in the input queue are transcribed together, up to max_batch_size. Prompts only wait
+    when the VAD is given audio faster than it is transcribed (e.g. a recording sent to SERVER/api.py): live speech
+    gives one prompt per turn. Wrapped in another STT handler (cache, cascade, router), it has no input queue and
+    transcribes one prompt at a time.
     """
 
     def setup(
         self,
         model_name="moonshine/base",
-        torch_dtype="float16",
+        torch_dtype="float32",
+        quantize=None,
+        length_buckets_s="2,4,8,16,32",
+        max_batch_size=4,
+        language="en",
         gen_kwargs={},
     ):
         self.torch_dtype = getattr(torch, torch_dtype)
         self.gen_kwargs = gen_kwargs
+        self.length_buckets = sorted(
+            int(float(bucket) * 16000) for bucket in length_buckets_s.split(",") if bucket
+        )
+        self.max_batch_size = max_batch_size
+        self.language = language
 
         self.tokenizer = moonshine.load_tokenizer()
         self.model = moonshine.load_model(model_name)
+        if quantize == "int8":
+            self.quantize_int8()
 
         self.warmup()
 
+    def quantize_int8(self):
+        # Keras 3 quantizes the dense layers of its models in place
+        quantized = False
+        for name in ("encoder", "decoder"):
+            component = getattr(self.model, name, None)
+            if component is not None and hasattr(component, "quantize"):
+                component.quantize("int8")
+                quantized = True
+        if not quantized:
+            logger.warning("int8 quantization isn't supported by this Moonshine version, keeping the original weights.")
+
+    def bucket_length(self, length):
+        for bucket in self.length_buckets:
+            if length <= bucket:
+                return bucket
+        return length
+
+    def prepare_model_inputs(self, spoken_prompts):
+        length = self.bucket_length(max(len(spoken_prompt) for spoken_prompt in spoken_prompts))
+        batch = np.zeros((len(spoken_prompts), length), dtype=np.float32)
+        for i, spoken_prompt in enumerate(spoken_prompts):
+            batch[i, : len(spoken_prompt)] = spoken_prompt
+        return torch.from_numpy(batch).to(self.torch_dtype)
+
+    def generate(self, spoken_prompts):
+        input_values = self.prepare_model_inputs(spoken_prompts)
+        # bound the generation by the actual audio length rather than the padded one (~6 tokens per second)
+        max_len = int(max(len(spoken_prompt) for spoken_prompt in spoken_prompts) / 16000 * 6) + 1
+        pred_ids = self.model.generate(input_values, max_len=max_len)
+        return self.tokenizer.decode_batch(pred_ids)
+
     def warmup(self):
         logger.info(f"Warming up {self.__class__.__name__}")
 
-        n_steps = 2
-        dummy_input = torch.randn(
-            (1, 16000),
-            dtype=self.torch_dtype,
-        )
-
         if torch.cuda.is_available():
             start_event = torch.cuda.Event(enable_timing=True)
             end_event = torch.cuda.Event(enable_timing=True)
             torch.cuda.synchronize()
             start_event.record()
+        start = perf_counter()
 
-        for _ in range(n_steps):
-            _ = self.model.generate(dummy_input)
+        # one step per bucket so that all the shapes are seen once
+        for bucket in self.length_buckets:
+            _ = self.generate([np.random.randn(bucket).astype(np.float32)])
 
         if torch.cuda.is_available():
             end_event.record()
@@ -56,6 +101,27 @@ class MoonshineSTTHandler(BaseHandler):
             logger.info(
                 f"{self.__class__.__name__}:  warmed up! time: {start_event.elapsed_time(end_event) * 1e-3:.3f} s"
             )
+        else:
+            logger.info(
+                f"{self.__class__.__name__}:  warmed up! time: {perf_counter() - start:.3f} s"
+            )
+
+    def get_queued_prompts(self):
+        """
+        Takes the spoken prompts already waiting in the input queue, up to max_batch_size - 1.
+        """
+        spoken_prompts = []
+        while len(spoken_prompts) < self.max_batch_size - 1:
+            try:
+                spoken_prompt = self.queue_in.get_nowait()
+            except Empty:
+                break
+            if isinstance(spoken_prompt, bytes) and spoken_prompt == b"END":
+                # put the sentinel back for the run loop to stop
+                self.queue_in.put(spoken_prompt)
+                break
+            spoken_prompts.append(spoken_prompt)
+        return spoken_prompts
 
     def process(self, spoken_prompt):
         logger.debug("infering moonshine...")
@@ -63,10 +129,15 @@ class MoonshineSTTHandler(BaseHandler):
         global pipeline_start
         pipeline_start = perf_counter()
 
-        pred_ids = self.model.generate(spoken_prompt[None, :])
-        pred_text = self.tokenizer.decode_batch(pred_ids)[0]
+        spoken_prompts = [spoken_prompt]
+        if self.queue_in is not None:
+            spoken_prompts += self.get_queued_prompts()
+        if len(spoken_prompts) > 1:
+            logger.debug(f"transcribing {len(spoken_prompts)} queued prompts as one batch")
 
-        logger.debug("finished whisper inference")
-        console.print(f"[yellow]USER: {pred_text}")
+        pred_texts = self.generate(spoken_prompts)
 
-        yield (pred_text, "en")
+        logger.debug("finished moonshine inference")
+        for pred_text in pred_texts:
+            console.print(f"[yellow]USER: {pred_text}")
+            yield (pred_text, self.language)
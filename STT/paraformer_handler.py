@@ -2,6 +2,7 @@ import logging
 from time import perf_counter
 
 from baseHandler import BaseHandler
+from utils.pipeline_events import PartialTranscript, SpeechChunk
 from funasr import AutoModel
 import numpy as np
 from rich.console import Console
@@ -20,21 +21,77 @@ class ParaformerSTTHandler(BaseHandler):
     Handles the Speech To Text generation using a Paraformer model.
     The default for this model is set to Chinese.
     This model was contributed by @wuhongsheng.
+    In streaming mode, the speech chunks sent by the VAD while the user is speaking are fed to a streaming
+    Paraformer model along with its cache, so that only the last chunk remains to be processed at the end of speech.
     """
 
     def setup(
         self,
         model_name="paraformer-zh",
         device="cuda",
+        streaming=False,
+        chunk_size_ms=600,
+        encoder_chunk_look_back=4,
+        decoder_chunk_look_back=1,
         gen_kwargs={},
     ):
         print(model_name)
         if len(model_name.split("/")) > 1:
             model_name = model_name.split("/")[-1]
+        if streaming and "streaming" not in model_name:
+            logger.warning(f"Streaming mode requires a streaming model such as 'paraformer-zh-streaming', got {model_name}.")
         self.device = device
+        self.streaming = streaming
+        # FunASR chunk size: (unused, chunk, lookahead) in multiples of 60 ms
+        self.chunk_size = [0, chunk_size_ms // 60, chunk_size_ms // 120]
+        self.chunk_stride = self.chunk_size[1] * 960
+        self.encoder_chunk_look_back = encoder_chunk_look_back
+        self.decoder_chunk_look_back = decoder_chunk_look_back
         self.model = AutoModel(model=model_name, device=device)
+        self.reset_stream()
         self.warmup()
 
+    def reset_stream(self):
+        self.cache = {}
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.fed_samples = 0
+        self.stream_text = ""
+
+    def feed(self, audio, is_final):
+        result = self.model.generate(
+            input=audio,
+            cache=self.cache,
+            is_final=is_final,
+            chunk_size=self.chunk_size,
+            encoder_chunk_look_back=self.encoder_chunk_look_back,
+            decoder_chunk_look_back=self.decoder_chunk_look_back,
+        )
+        self.fed_samples += len(audio)
+        if result:
+            self.stream_text += result[0]["text"]
+
+    def stream_chunk(self, speech_chunk):
+        if speech_chunk.offset == 0:
+            self.reset_stream()
+        self.pending = np.concatenate([self.pending, speech_chunk.audio])
+        while len(self.pending) >= self.chunk_stride:
+            self.feed(self.pending[: self.chunk_stride], is_final=False)
+            self.pending = self.pending[self.chunk_stride :]
+
+    def finalize_stream(self, spoken_prompt):
+        # the complete utterance may contain audio that wasn't streamed yet
+        remaining = spoken_prompt[self.fed_samples :].astype(np.float32)
+        while len(remaining) > self.chunk_stride:
+            self.feed(remaining[: self.chunk_stride], is_final=False)
+            remaining = remaining[self.chunk_stride :]
+        if len(remaining) == 0:
+            remaining = np.zeros(160, dtype=np.float32)
+        self.feed(remaining, is_final=True)
+
+        pred_text = self.stream_text
+        self.reset_stream()
+        return pred_text
+
     def warmup(self):
         logger.info(f"Warming up {self.__class__.__name__}")
 
@@ -42,17 +99,32 @@ class ParaformerSTTHandler(BaseHandler):
         n_steps = 1
         dummy_input = np.array([0] * 512, dtype=np.float32)
         for _ in range(n_steps):
-            _ = self.model.generate(dummy_input)[0]["text"].strip().replace(" ", "")
+            if self.streaming:
+                _ = self.finalize_stream(dummy_input)
+            else:
+                _ = self.model.generate(dummy_input)[0]["text"].strip().replace(" ", "")
 
     def process(self, spoken_prompt):
+        if isinstance(spoken_prompt, SpeechChunk):
+            if self.streaming:
+                previous_text = self.stream_text
+                self.stream_chunk(spoken_prompt)
+                # the streamed text is only appended to, the language model can start processing it
+                if self.stream_text != previous_text:
+                    yield PartialTranscript(self.stream_text.strip().replace(" ", ""))
+            return
+
         logger.debug("infering paraformer...")
 
         global pipeline_start
         pipeline_start = perf_counter()
 
-        pred_text = (
-            self.model.generate(spoken_prompt)[0]["text"].strip().replace(" ", "")
-        )
+        if self.streaming:
+            pred_text = self.finalize_stream(spoken_prompt).strip().replace(" ", "")
+        else:
+            pred_text = (
+                self.model.generate(spoken_prompt)[0]["text"].strip().replace(" ", "")
+            )
         torch.mps.empty_cache()
 
         logger.debug("finished paraformer inference")
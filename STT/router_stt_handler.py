@@ -0,0 +1,196 @@
+import gc
+import logging
+from collections import OrderedDict
+from time import perf_counter
+
+from faster_whisper import WhisperModel
+from rich.console import Console
+import torch
+
+from baseHandler import BaseHandler
+
+logger = logging.getLogger(__name__)
+
+console = Console()
+
+SUPPORTED_LANGUAGES = [
+    "en",
+    "fr",
+    "es",
+    "zh",
+    "ja",
+    "ko",
+    "hi",
+    "de",
+    "pt",
+    "pl",
+    "it",
+    "nl",
+]
+
+# approximate memory footprints of the checkpoints, used when the model doesn't expose its parameters
+MODEL_NAME_TO_MEMORY_MB = {
+    "tiny": 80,
+    "base": 150,
+    "small": 500,
+    "medium": 1500,
+    "large": 3100,
+    "paraformer": 900,
+}
+
+
+def parse_backends(backends):
+    """
+    Parses a comma-separated list of `language=backend:model_name[@memory_mb]` routes,
+    e.g. "en=faster-whisper:tiny.en,zh=paraformer:paraformer-zh@900,*=faster-whisper:large-v3".
+    The `*` language is used for languages without a dedicated route.
+    """
+    routes = {}
+    for route in backends.split(","):
+        language, spec = route.strip().split("=", 1)
+        memory_mb = None
+        if "@" in spec:
+            spec, memory_mb = spec.rsplit("@", 1)
+            memory_mb = float(memory_mb)
+        backend, model_name = spec.split(":", 1)
+        routes[language.strip()] = (backend.strip(), model_name.strip(), memory_mb)
+    return routes
+
+
+def estimate_memory_mb(handler, model_name):
+    model = getattr(handler, "model", None)
+    # FunASR's AutoModel wraps the torch module
+    if not isinstance(model, torch.nn.Module):
+        model = getattr(model, "model", None)
+    if isinstance(model, torch.nn.Module):
+        return sum(p.numel() * p.element_size() for p in model.parameters()) / 2**20
+    for name, memory_mb in MODEL_NAME_TO_MEMORY_MB.items():
+        if name in model_name:
+            return memory_mb
+    raise ValueError(f"Unknown memory footprint for {model_name}, set it with `@memory_mb` in the route.")
+
+
+class RouterSTTHandler(BaseHandler):
+    """
+    Routes each spoken prompt to an STT backend dedicated to its language.
+    The language is either given as a hint (the `language` argument, or an `(audio, language)` prompt)
+    or detected with a small multilingual Whisper model, once per session unless `redetect` is set. A session ends
+    after `session_timeout_s` without any spoken prompt, the language of the next one is detected again.
+    Backends are loaded on first use through `load_backend` and the least recently used ones are evicted
+    when the loaded backends exceed `memory_budget_mb`.
+    """
+
+    def setup(
+        self,
+        load_backend,
+        backends="en=faster-whisper:tiny.en,*=faster-whisper:large-v3",
+        language=None,
+        redetect=False,
+        session_timeout_s=60,
+        detector_model_name="tiny",
+        detector_device="auto",
+        detector_compute_type="int8",
+        memory_budget_mb=6000,
+        gen_kwargs={},
+    ):
+        self.load_backend = load_backend
+        self.routes = parse_backends(backends)
+        self.language_hint = language
+        self.redetect = redetect
+        self.session_timeout_s = session_timeout_s
+        self.memory_budget_mb = memory_budget_mb
+
+        self.detector = None
+        if language is None:
+            self.detector = WhisperModel(
+                detector_model_name, device=detector_device, compute_type=detector_compute_type
+            )
+
+        self.session_language = None
+        self.last_prompt_time = None
+        self.last_language = "en"
+        self.loaded = OrderedDict()  # route -> (handler, memory_mb)
+        self.route_counts = {}
+
+    def detect_language(self, spoken_prompt):
+        start = perf_counter()
+        # faster-whisper detects the language eagerly and decodes the segments lazily,
+        # hence not consuming the segments only costs the language detection
+        _, info = self.detector.transcribe(spoken_prompt)
+        logger.debug(
+            f"detected language {info.language} ({info.language_probability:.2f}) in {perf_counter() - start:.3f} s"
+        )
+        return info.language
+
+    def get_language(self, spoken_prompt, prompt_language):
+        if prompt_language is not None:
+            return prompt_language, False
+        if self.language_hint is not None:
+            return self.language_hint, False
+        now = perf_counter()
+        if self.last_prompt_time is not None and now - self.last_prompt_time > self.session_timeout_s:
+            # a new conversation, maybe with another speaker
+            self.session_language = None
+        self.last_prompt_time = now
+        if self.session_language is None or self.redetect:
+            language = self.detect_language(spoken_prompt)
+            if language not in SUPPORTED_LANGUAGES:
+                logger.warning(f"Detected unsupported language: {language}, using {self.last_language}")
+                language = self.last_language
+            self.session_language = language
+        return self.session_language, True
+
+    def get_backend(self, language):
+        route = language if language in self.routes else "*"
+        if route not in self.routes:
+            raise ValueError(f"No STT backend for language {language}, add a route for it or a `*` route.")
+
+        if route in self.loaded:
+            self.loaded.move_to_end(route)
+            return self.loaded[route][0]
+
+        backend, model_name, memory_mb = self.routes[route]
+        logger.info(f"Loading {backend} STT backend {model_name} for language {route}")
+        handler = self.load_backend(backend, model_name, None if route == "*" else route)
+        if memory_mb is None:
+            try:
+                memory_mb = estimate_memory_mb(handler, model_name)
+            except ValueError:
+                handler.cleanup()
+                raise
+        self.loaded[route] = (handler, memory_mb)
+        self.evict()
+        return handler
+
+    def evict(self):
+        used_mb = sum(memory_mb for _, memory_mb in self.loaded.values())
+        # never evict the backend that was just loaded
+        while used_mb > self.memory_budget_mb and len(self.loaded) > 1:
+            route, (handler, memory_mb) = self.loaded.popitem(last=False)
+            logger.info(f"Evicting STT backend for language {route} ({memory_mb:.0f} MB)")
+            handler.cleanup()
+            del handler
+            used_mb -= memory_mb
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def process(self, spoken_prompt):
+        prompt_language = None
+        if isinstance(spoken_prompt, tuple):
+            spoken_prompt, prompt_language = spoken_prompt
+
+        language, detected = self.get_language(spoken_prompt, prompt_language)
+        self.last_language = language
+        handler = self.get_backend(language)
+        self.route_counts[language] = self.route_counts.get(language, 0) + 1
+
+        for output in handler.process(spoken_prompt):
+            pred_text = output[0] if isinstance(output, tuple) else output
+            language_code = f"{language}-auto" if detected else language
+            yield (pred_text, language_code)
+
+    def cleanup(self):
+        logger.info(f"{self.__class__.__name__}: prompts per language: {self.route_counts}")
+        for handler, _ in self.loaded.values():
+            handler.cleanup()
@@ -0,0 +1,177 @@
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from rich.console import Console
+
+from baseHandler import BaseHandler
+from utils.pipeline_events import SpeechChunk
+
+logger = logging.getLogger(__name__)
+
+console = Console()
+
+
+def mel_filterbank(sample_rate, n_fft, n_bands):
+    """
+    Triangular mel filterbank of shape (n_bands, n_fft // 2 + 1).
+    """
+
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    fft_freqs = np.linspace(0, sample_rate / 2, n_fft // 2 + 1)
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_bands + 2)
+    hz_points = mel_to_hz(mel_points)
+
+    filterbank = np.zeros((n_bands, len(fft_freqs)), dtype=np.float32)
+    for i in range(n_bands):
+        left, center, right = hz_points[i : i + 3]
+        rising = (fft_freqs - left) / (center - left)
+        falling = (right - fft_freqs) / (right - center)
+        filterbank[i] = np.maximum(0, np.minimum(rising, falling))
+    return filterbank
+
+
+def audio_fingerprint(
+    audio,
+    sample_rate=16000,
+    n_bands=16,
+    n_frames=32,
+    silence_threshold=0.02,
+    frame_ms=25,
+    hop_ms=10,
+    dynamic_range=6.0,
+):
+    """
+    Computes a fingerprint robust to gain changes, leading/trailing silence and small noise.
+    The log-mel spectrogram of the trimmed utterance is pooled on a fixed (n_frames, n_bands) grid and each bit
+    is the sign of the band energy difference change between consecutive frames (as in Haitsma & Kalker's audio hashing).
+    Returns the duration of the trimmed utterance in 250 ms buckets and the fingerprint bits, or None for silent audio.
+    """
+    audio = np.asarray(audio, dtype=np.float32).squeeze()
+    peak = np.abs(audio).max() if audio.size else 0.0
+    if peak == 0:
+        return None
+    audio = audio / peak
+
+    voiced = np.flatnonzero(np.abs(audio) > silence_threshold)
+    audio = audio[voiced[0] : voiced[-1] + 1]
+
+    frame_length = int(sample_rate * frame_ms / 1000)
+    hop_length = int(sample_rate * hop_ms / 1000)
+    if len(audio) < frame_length:
+        audio = np.pad(audio, (0, frame_length - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length)[::hop_length]
+    n_fft = 1 << (frame_length - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_length), n=n_fft)) ** 2
+    log_mel = np.log(power @ mel_filterbank(sample_rate, n_fft, n_bands).T + 1e-10)
+    # limit the dynamic range so that background noise in near silent bands doesn't change the fingerprint
+    log_mel = np.maximum(log_mel, log_mel.max() - dynamic_range)
+
+    # pool on a fixed time grid so that small duration changes map to the same shape
+    bounds = np.linspace(0, len(log_mel), n_frames + 1).astype(int)
+    grid = np.stack(
+        [log_mel[start : max(end, start + 1)].mean(axis=0) for start, end in zip(bounds[:-1], bounds[1:])]
+    )
+
+    band_diff = np.diff(grid, axis=1)
+    bits = np.diff(band_diff, axis=0) > 0
+
+    duration = int(round(len(audio) / sample_rate / 0.25))
+    return duration, bits.ravel()
+
+
+class CachedSTTHandler(BaseHandler):
+    """
+    Content-addressed cache in front of an STT handler.
+    Spoken prompts are keyed by their audio fingerprint: exact or near-exact repeats (e.g. "yes", "no", menu digits)
+    are answered from the cache without running the wrapped model. A cached entry matches when it has the same duration
+    and at most max_bit_error_rate of its fingerprint bits differ. The least recently used entries are evicted
+    once max_entries is reached.
+    """
+
+    def setup(
+        self,
+        handler,
+        max_entries=256,
+        sample_rate=16000,
+        n_bands=16,
+        n_frames=32,
+        max_bit_error_rate=0.2,
+        gen_kwargs={},
+    ):
+        self.handler = handler
+        self.max_entries = max_entries
+        self.max_bit_error_rate = max_bit_error_rate
+        self.fingerprint_kwargs = {
+            "sample_rate": sample_rate,
+            "n_bands": n_bands,
+            "n_frames": n_frames,
+        }
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def lookup(self, fingerprint):
+        """
+        Returns the key of the cached entry matching the fingerprint, if any.
+        """
+        duration, bits = fingerprint
+        key = (duration, bits.tobytes())
+        if key in self.cache:
+            return key
+
+        best_key, best_error_rate = None, self.max_bit_error_rate
+        for cached_key, (cached_bits, _) in self.cache.items():
+            if cached_key[0] != duration:
+                continue
+            error_rate = np.count_nonzero(cached_bits != bits) / bits.size
+            if error_rate <= best_error_rate:
+                best_key, best_error_rate = cached_key, error_rate
+        return best_key
+
+    def process(self, spoken_prompt):
+        if isinstance(spoken_prompt, SpeechChunk):
+            yield from self.handler.process(spoken_prompt)
+            return
+
+        fingerprint = audio_fingerprint(spoken_prompt, **self.fingerprint_kwargs)
+        key = self.lookup(fingerprint) if fingerprint is not None else None
+
+        if key is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            _, outputs = self.cache[key]
+            logger.debug(f"STT cache hit ({self.hits} hits, {self.misses} misses)")
+            for output in outputs:
+                pred_text = output[0] if isinstance(output, tuple) else output
+                console.print(f"[yellow]USER: {pred_text}")
+                yield output
+            return
+
+        self.misses += 1
+        outputs = []
+        for output in self.handler.process(spoken_prompt):
+            outputs.append(output)
+            yield output
+
+        if fingerprint is not None:
+            duration, bits = fingerprint
+            self.cache[(duration, bits.tobytes())] = (bits, outputs)
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def cleanup(self):
+        logger.info(
+            f"{self.__class__.__name__}: {self.hits} hits, {self.misses} misses, hit rate: {self.hit_rate:.2%}"
+        )
+        self.handler.cleanup()
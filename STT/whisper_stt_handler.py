@@ -1,11 +1,15 @@
 from time import perf_counter
 from transformers import (
     AutoProcessor,
+    AutoModelForCausalLM,
     AutoModelForSpeechSeq2Seq
 )
 import torch
 from copy import copy
 from baseHandler import BaseHandler
+from STT.long_form import merge_transcripts, split_long_audio
+from utils.assisted_generation import AssistedGenerationStats
+from utils.quantization import quantize_dynamic_int8
 from rich.console import Console
 import logging
 
@@ -40,11 +44,24 @@ class WhisperSTTHandler(BaseHandler):
         torch_dtype="float16",
         compile_mode=None,
         language=None,
+        assistant_model_name=None,
+        assistant_shares_encoder=True,
+        long_form_chunking=True,
+        chunk_overlap_s=1.0,
+        quantize=None,
         gen_kwargs={},
     ):
         self.device = device
         self.torch_dtype = getattr(torch, torch_dtype)
+        self.quantize = quantize == "int8" and device == "cpu"
+        if quantize == "int8" and not self.quantize:
+            logger.warning(f"Dynamic int8 quantization is only supported on CPU, not quantizing the model on {device}.")
+        if self.quantize:
+            # quantized linear layers take float32 activations
+            self.torch_dtype = torch.float32
         self.compile_mode = compile_mode
+        self.long_form_chunking = long_form_chunking
+        self.chunk_overlap_s = chunk_overlap_s
         self.gen_kwargs = gen_kwargs
         self.start_language = language
         self.last_language = language if language != "auto" else None
@@ -56,6 +73,14 @@ class WhisperSTTHandler(BaseHandler):
             model_name,
             torch_dtype=self.torch_dtype,
         ).to(device)
+        if self.quantize:
+            self.model = quantize_dynamic_int8(self.model, device)
+
+        # speculative decoding
+        self.assistant_model = None
+        self.assisted_stats = None
+        if assistant_model_name is not None:
+            self.load_assistant_model(assistant_model_name, assistant_shares_encoder)
 
         # compile
         if self.compile_mode:
@@ -65,6 +90,51 @@ class WhisperSTTHandler(BaseHandler):
             )
         self.warmup()
 
+    def load_assistant_model(self, assistant_model_name, assistant_shares_encoder):
+        if self.compile_mode:
+            logger.warning(
+                "Assisted generation does not support the static cache required by torch compile, disabling compilation."
+            )
+            self.compile_mode = None
+        if self.gen_kwargs.get("num_beams", 1) > 1:
+            raise ValueError("Assisted generation only supports greedy decoding, set `stt_gen_num_beams` to 1.")
+
+        # a distilled checkpoint sharing the main model's encoder only needs its decoder:
+        # the assistant then reuses the encoder outputs computed by the main model
+        model_class = AutoModelForCausalLM if assistant_shares_encoder else AutoModelForSpeechSeq2Seq
+        self.assistant_model = model_class.from_pretrained(
+            assistant_model_name,
+            torch_dtype=self.torch_dtype,
+        ).to(self.device)
+        if self.quantize:
+            self.assistant_model = quantize_dynamic_int8(self.assistant_model, self.device)
+        self.gen_kwargs["assistant_model"] = self.assistant_model
+        self.assisted_stats = AssistedGenerationStats(
+            self.model, self.assistant_model, input_ids_key="decoder_input_ids"
+        )
+
+    def generate(self, input_features, gen_kwargs):
+        if self.assisted_stats is None:
+            return self.model.generate(input_features, **gen_kwargs)
+
+        if input_features.shape[0] > 1:
+            # assisted generation only supports a batch size of 1
+            pred_ids = [self.generate(features[None], gen_kwargs)[0] for features in input_features]
+            return torch.nn.utils.rnn.pad_sequence(
+                pred_ids, batch_first=True, padding_value=self.processor.tokenizer.pad_token_id
+            )
+
+        start = perf_counter()
+        with self.assisted_stats.track():
+            pred_ids = self.model.generate(input_features, **gen_kwargs)
+        elapsed = perf_counter() - start
+        new_tokens, acceptance_rate, speedup = self.assisted_stats.update(pred_ids.shape[-1], elapsed=elapsed)
+        logger.debug(
+            f"assisted generation: {new_tokens} tokens in {elapsed:.3f} s, "
+            f"acceptance rate: {acceptance_rate:.2%}, tokens per main model forward: {speedup:.2f}"
+        )
+        return pred_ids
+
     def prepare_model_inputs(self, spoken_prompt):
         input_features = self.processor(
             spoken_prompt, sampling_rate=16000, return_tensors="pt"
@@ -105,6 +175,8 @@ class WhisperSTTHandler(BaseHandler):
 
         for _ in range(n_steps):
             _ = self.model.generate(dummy_input, **warmup_gen_kwargs)
+        if self.assisted_stats is not None:
+            self.assisted_stats.reset()
 
         if self.device == "cuda":
             end_event.record()
@@ -120,8 +192,16 @@ class WhisperSTTHandler(BaseHandler):
         global pipeline_start
         pipeline_start = perf_counter()
 
-        input_features = self.prepare_model_inputs(spoken_prompt)
-        pred_ids = self.model.generate(input_features, **self.gen_kwargs)
+        # prompts longer than Whisper's 30 s window are split into overlapping windows transcribed as one batch
+        if self.long_form_chunking:
+            chunks = split_long_audio(spoken_prompt, overlap_s=self.chunk_overlap_s)
+        else:
+            chunks = [spoken_prompt]
+        if len(chunks) > 1:
+            logger.debug(f"transcribing {len(chunks)} windows as one batch")
+
+        input_features = self.prepare_model_inputs(chunks)
+        pred_ids = self.generate(input_features, self.gen_kwargs)
         language_code = self.processor.tokenizer.decode(pred_ids[0, 1])[2:-2]  # remove "<|" and "|>"
 
         if language_code not in SUPPORTED_LANGUAGES:  # reprocess with the last language
@@ -129,13 +209,15 @@ class WhisperSTTHandler(BaseHandler):
             gen_kwargs = copy(self.gen_kwargs)
             gen_kwargs['language'] = self.last_language
             language_code = self.last_language
-            pred_ids = self.model.generate(input_features, **gen_kwargs)
+            pred_ids = self.generate(input_features, gen_kwargs)
         else:
             self.last_language = language_code
         
-        pred_text = self.processor.batch_decode(
-            pred_ids, skip_special_tokens=True, decode_with_timestamps=False
-        )[0]
+        pred_text = merge_transcripts(
+            self.processor.batch_decode(
+                pred_ids, skip_special_tokens=True, decode_with_timestamps=False
+            )
+        )
         language_code = self.processor.tokenizer.decode(pred_ids[0, 1])[2:-2] # remove "<|" and "|>"
 
         logger.debug("finished whisper inference")
@@ -146,3 +228,7 @@ class WhisperSTTHandler(BaseHandler):
             language_code += "-auto"
             
         yield (pred_text, language_code)
+
+    def cleanup(self):
+        if self.assisted_stats is not None:
+            self.assisted_stats.log_summary(self.__class__.__name__)
@@ -0,0 +1,64 @@
+"""
+Benchmarks the real-time factor (processing time / audio duration) of the Moonshine STT on CPU,
+with and without length bucketing, int8 quantization and batching.
+
+Usage: CUDA_VISIBLE_DEVICES="" python TEST/benchmark_moonshine.py --audio speech_16khz.wav
+"""
+import argparse
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from STT.moonshine_handler import MoonshineSTTHandler
+
+
+def load_audio(path):
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getframerate() != 16000 or wav_file.getnchannels() != 1:
+            raise ValueError("Expected a 16 kHz mono wav file.")
+        frames = wav_file.readframes(wav_file.getnframes())
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768
+
+
+def make_prompts(audio, n_prompts):
+    """Cuts the audio into prompts of varying lengths, as the VAD would."""
+    rng = np.random.default_rng(0)
+    prompts = []
+    for _ in range(n_prompts):
+        length = int(rng.uniform(1.0, min(10.0, len(audio) / 16000)) * 16000)
+        start = rng.integers(0, len(audio) - length + 1)
+        prompts.append(audio[start : start + length])
+    return prompts
+
+
+def benchmark(name, setup_kwargs, prompts, batch_size):
+    handler = MoonshineSTTHandler(None, queue_in=None, queue_out=None, setup_kwargs=setup_kwargs)
+    audio_duration = sum(len(prompt) for prompt in prompts) / 16000
+
+    start = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        handler.generate(prompts[i : i + batch_size])
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<32} RTF: {elapsed / audio_duration:.3f} ({elapsed:.2f} s for {audio_duration:.1f} s of audio)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio", required=True, help="16 kHz mono wav file with speech.")
+    parser.add_argument("--model_name", default="moonshine/base")
+    parser.add_argument("--n_prompts", type=int, default=16)
+    args = parser.parse_args()
+
+    prompts = make_prompts(load_audio(args.audio), args.n_prompts)
+    base_kwargs = {"model_name": args.model_name, "torch_dtype": "float32"}
+
+    benchmark("float32, exact lengths", {**base_kwargs, "length_buckets_s": ""}, prompts, 1)
+    benchmark("float32, bucketed", base_kwargs, prompts, 1)
+    benchmark("int8, bucketed", {**base_kwargs, "quantize": "int8"}, prompts, 1)
+    benchmark("int8, bucketed, batch of 4", {**base_kwargs, "quantize": "int8"}, prompts, 4)
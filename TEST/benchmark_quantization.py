@@ -0,0 +1,118 @@
+"""
+Compares the float32 and dynamic int8 versions of the CPU STT (transformers Whisper) and TTS (Facebook MMS) models:
+real-time factor, serialized model size, and WER. For the STT, the WER of the int8 transcript is computed against the
+reference transcript if given, the float32 transcript otherwise. For the TTS, the synthesized speech is transcribed by
+the float32 STT and compared with the input text, as an intelligibility proxy.
+
+Usage: python TEST/benchmark_quantization.py --audio speech_16khz.wav [--reference "the spoken text"]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from STT.whisper_stt_handler import WhisperSTTHandler
+from TTS.facebookmms_handler import FacebookMMSTTSHandler
+from threading import Event
+
+TTS_TEXT = "Our store is open from nine in the morning until six in the evening, Monday to Saturday."
+
+
+def load_audio(path):
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getframerate() != 16000 or wav_file.getnchannels() != 1:
+            raise ValueError("Expected a 16 kHz mono wav file.")
+        frames = wav_file.readframes(wav_file.getnframes())
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768
+
+
+def word_error_rate(reference, hypothesis):
+    reference = reference.lower().split()
+    hypothesis = hypothesis.lower().split()
+    distances = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hypothesis, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1, distances[j - 1] + 1, previous + (ref_word != hyp_word)
+            )
+    return distances[-1] / max(len(reference), 1)
+
+
+def model_size_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def transcribe(stt, audio):
+    return next(stt.process(audio))[0]
+
+
+def benchmark_stt(model_name, audio, quantize, n_runs):
+    stt = WhisperSTTHandler(
+        Event(),
+        queue_in=None,
+        queue_out=None,
+        setup_kwargs={
+            "model_name": model_name,
+            "device": "cpu",
+            "torch_dtype": "float32",
+            "language": "en",
+            "quantize": quantize,
+            "gen_kwargs": {"max_new_tokens": 128},
+        },
+    )
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        text = transcribe(stt, audio)
+    rtf = (time.perf_counter() - start) / n_runs / (len(audio) / 16000)
+    return stt, text, rtf, model_size_mb(stt.model)
+
+
+def benchmark_tts(quantize, n_runs):
+    tts = FacebookMMSTTSHandler(
+        Event(),
+        queue_in=None,
+        queue_out=None,
+        setup_args=(Event(),),
+        setup_kwargs={"device": "cpu", "quantize": quantize},
+    )
+    torch.manual_seed(0)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        audio = np.concatenate(list(tts.process(TTS_TEXT))).astype(np.float32) / 32768
+    rtf = (time.perf_counter() - start) / n_runs / (len(audio) / 16000)
+    return audio, rtf, model_size_mb(tts.model)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio", required=True, help="16 kHz mono wav file with speech.")
+    parser.add_argument("--reference", default=None, help="Reference transcript of the audio.")
+    parser.add_argument("--stt_model_name", default="openai/whisper-small.en")
+    parser.add_argument("--n_runs", type=int, default=3)
+    args = parser.parse_args()
+    torch.set_num_threads(os.cpu_count())
+
+    audio = load_audio(args.audio)
+    stt, fp32_text, fp32_rtf, fp32_size = benchmark_stt(args.stt_model_name, audio, None, args.n_runs)
+    _, int8_text, int8_rtf, int8_size = benchmark_stt(args.stt_model_name, audio, "int8", args.n_runs)
+    reference = args.reference or fp32_text
+
+    print(f"STT {args.stt_model_name}")
+    print(f"  float32  RTF: {fp32_rtf:.3f}  size: {fp32_size:.0f} MB  WER: {word_error_rate(reference, fp32_text):.2%}")
+    print(f"  int8     RTF: {int8_rtf:.3f}  size: {int8_size:.0f} MB  WER: {word_error_rate(reference, int8_text):.2%}")
+
+    print("TTS facebook/mms-tts-eng")
+    for quantize in (None, "int8"):
+        tts_audio, rtf, size = benchmark_tts(quantize, args.n_runs)
+        wer = word_error_rate(TTS_TEXT.replace(",", "").replace(".", ""), transcribe(stt, tts_audio).replace(",", "").replace(".", ""))
+        print(f"  {quantize or 'float32':<8} RTF: {rtf:.3f}  size: {size:.0f} MB  intelligibility WER: {wer:.2%}")
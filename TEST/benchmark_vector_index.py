@@ -0,0 +1,118 @@
+"""
+Compares the memory-mapped IVF index of RAG/vector_index.py with Chroma on synthetic clustered embeddings:
+startup time, then recall@k against the exact search and search latency, per query and for batches of concurrent
+queries, for several numbers of probed clusters.
+
+Usage: python TEST/benchmark_vector_index.py [--n_vectors 100000 --dim 384 --k 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RAG.vector_index import IVFIndex
+
+
+def make_embeddings(rng, n, dim, centers):
+    """Unit norm embeddings scattered around topic centers, like the chunks of a few documents."""
+    vectors = centers[rng.integers(len(centers), size=n)] + 1.5 * rng.normal(size=(n, dim)) / np.sqrt(dim)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall(ids, exact_ids):
+    k = exact_ids.shape[1]
+    return np.mean([len(set(found) & set(exact)) / k for found, exact in zip(ids, exact_ids)])
+
+
+def benchmark_ivf(path, queries, exact_ids, k, n_probes, batch_size, dtype):
+    start = time.perf_counter()
+    index = IVFIndex(path)
+    print(f"IVF ({dtype}, {index.n_lists} clusters): loaded in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        ids = np.concatenate([index.search(query, k=k, n_probe=n_probe)[1] for query in queries])
+        single_ms = (time.perf_counter() - start) / len(queries) * 1e3
+
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch_size):
+            index.search(queries[i : i + batch_size], k=k, n_probe=n_probe)
+        batched_ms = (time.perf_counter() - start) / len(queries) * 1e3
+        print(
+            f"  n_probe {n_probe:>4}: recall@{k} {recall(ids, exact_ids):.3f}, "
+            f"{single_ms:.3f} ms per query, {batched_ms:.3f} ms per query in batches of {batch_size}"
+        )
+
+
+def benchmark_chroma(vectors, queries, exact_ids, k):
+    try:
+        import chromadb
+    except ImportError:
+        print("Chroma: chromadb isn't installed, skipping")
+        return
+
+    path = tempfile.mkdtemp()
+    try:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection("benchmark", metadata={"hnsw:space": "ip"})
+        for i in range(0, len(vectors), 5000):
+            collection.add(
+                ids=[str(j) for j in range(i, min(i + 5000, len(vectors)))],
+                embeddings=vectors[i : i + 5000].tolist(),
+            )
+        del collection, client
+
+        start = time.perf_counter()
+        collection = chromadb.PersistentClient(path=path).get_collection("benchmark")
+        collection.query(query_embeddings=queries[:1].tolist(), n_results=k)
+        print(f"Chroma (HNSW): loaded in {(time.perf_counter() - start) * 1e3:.1f} ms (including a first query)")
+
+        start = time.perf_counter()
+        ids = np.array(
+            [
+                [int(i) for i in collection.query(query_embeddings=[query.tolist()], n_results=k)["ids"][0]]
+                for query in queries
+            ]
+        )
+        single_ms = (time.perf_counter() - start) / len(queries) * 1e3
+        print(f"  recall@{k} {recall(ids, exact_ids):.3f}, {single_ms:.3f} ms per query")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--n_queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n_probes", default="1,2,4,8,16,32")
+    parser.add_argument("--batch_size", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(args.n_vectors // 2000, 1), args.dim)) / np.sqrt(args.dim)
+    vectors = make_embeddings(rng, args.n_vectors, args.dim, centers)
+    queries = make_embeddings(rng, args.n_queries, args.dim, centers)
+
+    start = time.perf_counter()
+    exact_ids = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.k]
+    print(f"exact search (in memory, float32): {(time.perf_counter() - start) / args.n_queries * 1e3:.3f} ms per query")
+
+    n_probes = [int(n_probe) for n_probe in args.n_probes.split(",")]
+    for dtype in ("float32", "float16"):
+        path = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            IVFIndex.build(path, vectors, dtype=dtype)
+            print(f"IVF ({dtype}): built in {time.perf_counter() - start:.2f} s")
+            benchmark_ivf(path, queries, exact_ids, args.k, n_probes, args.batch_size, dtype)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    benchmark_chroma(vectors, queries, exact_ids, args.k)
@@ -0,0 +1,128 @@
+"""
+Minimal OpenAI-compatible chat completions server, to test the open_api language model handler without an upstream
+provider: configurable time to first token, time between tokens and error rate.
+
+Usage: python TEST/mock_openai_server.py --port 8001 --first_token_delay_s 0.2 --error_rate 0.1
+then: python s2s_pipeline.py --llm open_api --open_api_endpoints mock@http://localhost:8001/v1,...
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+DEFAULT_REPLY = "Sure. This reply comes from a mock server, it is streamed word by word. Is there anything else?"
+
+
+def make_handler(reply, first_token_delay_s, token_delay_s, error_rate, jitter_s):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_event(self, body):
+            data = f"data: {json.dumps(body) if isinstance(body, dict) else body}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            if random.random() < error_rate:
+                self.send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+                return
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = request.get("model", "mock")
+            time.sleep(first_token_delay_s + random.uniform(0, jitter_s))
+
+            if not request.get("stream"):
+                self.send_json(
+                    200,
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                        ],
+                    },
+                )
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(delta, finish_reason=None):
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+
+            try:
+                self.send_event(chunk({"role": "assistant", "content": ""}))
+                for i, word in enumerate(reply.split(" ")):
+                    if i:
+                        time.sleep(token_delay_s)
+                    self.send_event(chunk({"content": word if i == 0 else " " + word}))
+                self.send_event(chunk({}, finish_reason="stop"))
+                self.send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # the client cancelled the request, e.g. it lost a hedge
+                pass
+
+    return MockHandler
+
+
+def serve(port, reply=DEFAULT_REPLY, first_token_delay_s=0.1, token_delay_s=0.02, error_rate=0.0, jitter_s=0.0):
+    """
+    Starts a mock server in a background thread and returns it, stop it with `server.shutdown()`.
+    """
+    server = ThreadingHTTPServer(
+        ("localhost", port), make_handler(reply, first_token_delay_s, token_delay_s, error_rate, jitter_s)
+    )
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--first_token_delay_s", type=float, default=0.1)
+    parser.add_argument("--token_delay_s", type=float, default=0.02)
+    parser.add_argument("--jitter_s", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("localhost", args.port),
+        make_handler(args.reply, args.first_token_delay_s, args.token_delay_s, args.error_rate, args.jitter_s),
+    )
+    server.daemon_threads = True
+    print(f"Mock OpenAI-compatible server on http://localhost:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
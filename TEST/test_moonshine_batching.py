@@ -0,0 +1,129 @@
+"""
+Checks that the Moonshine STT of the pipeline transcribes the spoken prompts queued behind the current one as a batch,
+as happens when the VAD segments a recording faster than it is transcribed (e.g. a file sent to SERVER/api.py),
+and that behind the STT cache each prompt still goes through the cache on its own.
+The STT is built by s2s_pipeline.get_stt_handler with the command line arguments, like in the pipeline.
+
+Usage: CUDA_VISIBLE_DEVICES="" python TEST/test_moonshine_batching.py [--audio speech_16khz.wav --n_prompts 6]
+"""
+import argparse
+import os
+import sys
+import wave
+from queue import Queue
+from threading import Event, Thread
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s2s_pipeline import get_stt_handler, parse_arguments, prepare_all_args
+
+
+def load_prompts(path, n_prompts):
+    """Utterances of 1 to 4 s, cut from the recording if any, as the VAD would send them."""
+    rng = np.random.default_rng(0)
+    if path is not None:
+        with wave.open(path, "rb") as wav_file:
+            audio = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16).astype(np.float32) / 32768
+    else:
+        audio = 0.1 * rng.standard_normal(16000 * 8).astype(np.float32)
+    prompts = []
+    for _ in range(n_prompts):
+        length = int(rng.uniform(1.0, min(4.0, len(audio) / 16000)) * 16000)
+        start = rng.integers(0, len(audio) - length + 1)
+        prompts.append(audio[start : start + length])
+    return prompts
+
+
+def build_stt(argv):
+    sys.argv = ["s2s_pipeline.py", "--stt", "moonshine", *argv]
+    (
+        module_kwargs,
+        _,
+        _,
+        _,
+        whisper_stt_handler_kwargs,
+        paraformer_stt_handler_kwargs,
+        faster_whisper_stt_handler_kwargs,
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
+        *other_kwargs,
+    ) = parse_arguments()
+    prepare_all_args(
+        module_kwargs,
+        whisper_stt_handler_kwargs,
+        paraformer_stt_handler_kwargs,
+        faster_whisper_stt_handler_kwargs,
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
+        *other_kwargs,
+    )
+    spoken_prompt_queue, text_prompt_queue = Queue(), Queue()
+    stt = get_stt_handler(
+        module_kwargs,
+        Event(),
+        spoken_prompt_queue,
+        text_prompt_queue,
+        whisper_stt_handler_kwargs,
+        faster_whisper_stt_handler_kwargs,
+        paraformer_stt_handler_kwargs,
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
+    )
+    return stt, spoken_prompt_queue, text_prompt_queue
+
+
+def run(stt, moonshine, spoken_prompt_queue, text_prompt_queue, prompts):
+    """Queues the prompts before the STT thread starts, returns the batch sizes and the outputs."""
+    batch_sizes = []
+    generate = moonshine.generate
+
+    def recording_generate(spoken_prompts):
+        batch_sizes.append(len(spoken_prompts))
+        return generate(spoken_prompts)
+
+    moonshine.generate = recording_generate
+    for prompt in prompts:
+        spoken_prompt_queue.put(prompt)
+    spoken_prompt_queue.put(b"END")
+    thread = Thread(target=stt.run)
+    thread.start()
+    thread.join()
+
+    outputs = []
+    while True:
+        output = text_prompt_queue.get()
+        if output == b"END":
+            return batch_sizes, outputs
+        outputs.append(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio", default=None)
+    parser.add_argument("--n_prompts", type=int, default=6)
+    parser.add_argument("--max_batch_size", type=int, default=4)
+    args = parser.parse_args()
+    prompts = load_prompts(args.audio, args.n_prompts)
+    batch_args = ["--moonshine_stt_max_batch_size", str(args.max_batch_size)]
+
+    stt, spoken_prompt_queue, text_prompt_queue = build_stt(batch_args)
+    batch_sizes, outputs = run(stt, stt, spoken_prompt_queue, text_prompt_queue, prompts)
+    print(f"moonshine: {len(prompts)} queued prompts transcribed in batches of {batch_sizes}")
+    assert sum(batch_sizes) == len(prompts) and len(outputs) == len(prompts)
+    assert max(batch_sizes) > 1, "the queued prompts weren't batched"
+    assert max(batch_sizes) <= args.max_batch_size
+
+    stt, spoken_prompt_queue, text_prompt_queue = build_stt(batch_args + ["--stt_cache_max_entries", "16"])
+    batch_sizes, outputs = run(stt, stt.handler, spoken_prompt_queue, text_prompt_queue, prompts)
+    print(f"moonshine behind the STT cache: batches of {batch_sizes}, cache misses: {stt.misses}, hits: {stt.hits}")
+    assert batch_sizes == [1] * stt.misses, "prompts were taken past the cache"
+    assert stt.hits + stt.misses == len(prompts) and len(outputs) == len(prompts)
+    print("ok")
@@ -0,0 +1,60 @@
+"""
+Runs the open_api language model handler against local mock servers: a primary endpoint with a slow tail and
+errors, and a fast secondary. Prints the time to first token of each prompt and which endpoints served them.
+
+Usage: python TEST/test_open_api_failover.py [--n_prompts 30]
+"""
+import argparse
+import logging
+import os
+import sys
+from threading import Event
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.openai_api_language_model import OpenApiModelHandler
+from mock_openai_server import serve
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_prompts", type=int, default=30)
+    parser.add_argument("--hedge_percentile", type=float, default=95)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    # the primary has a 1 s tail and errors, the secondary is steady
+    primary = serve(8011, first_token_delay_s=0.1, jitter_s=1.0, error_rate=0.15)
+    secondary = serve(8012, first_token_delay_s=0.3)
+
+    handler = OpenApiModelHandler(
+        Event(),
+        queue_in=None,
+        queue_out=None,
+        setup_kwargs={
+            "api_key": "mock",
+            "endpoints": "mock@http://localhost:8011/v1,mock@http://localhost:8012/v1",
+            "hedge_percentile": args.hedge_percentile,
+            "hedge_delay_s": 0.5,
+            "chat_size": 2,
+        },
+    )
+
+    for i in range(args.n_prompts):
+        sentences = list(handler.process(f"Question number {i}?"))
+        assert any(sentence for sentence, _ in sentences), "empty reply"
+
+    latencies = handler.pool.first_token_latencies
+    print(
+        f"time to first token: p50 {np.percentile(latencies, 50):.3f} s, p95 {np.percentile(latencies, 95):.3f} s, "
+        f"max {max(latencies):.3f} s"
+    )
+    for endpoint in handler.pool.endpoints:
+        print(
+            f"{endpoint.name}: {endpoint.n_requests} requests, {endpoint.n_served} served, "
+            f"{endpoint.n_errors} errors, {endpoint.n_slow} lost hedges"
+        )
+    handler.cleanup()
+    primary.shutdown()
+    secondary.shutdown()
@@ -1,6 +1,7 @@
 import ChatTTS
 import logging
 from baseHandler import BaseHandler
+from utils.speaking_rate import measure_speech
 import librosa
 import numpy as np
 from rich.console import Console
@@ -22,8 +23,12 @@ class ChatTTSHandler(BaseHandler):
         gen_kwargs={},  # Unused
         stream=True,
         chunk_size=512,
+        speaking_rate=None,
+        response_cache=None,
     ):
         self.should_listen = should_listen
+        self.speaking_rate = speaking_rate
+        self.response_cache = response_cache
         self.device = device
         self.model = ChatTTS.Chat()
         self.model.load(compile=False)  # Doesn't work for me with True
@@ -40,6 +45,12 @@ class ChatTTSHandler(BaseHandler):
         _ = self.model.infer("text")
 
     def process(self, llm_sentence):
+        audio_chunks = self.synthesize(llm_sentence)
+        if self.response_cache is not None:
+            audio_chunks = self.response_cache.synthesize(llm_sentence, audio_chunks, self.should_listen)
+        yield from measure_speech(self.speaking_rate, llm_sentence, audio_chunks)
+
+    def synthesize(self, llm_sentence):
         console.print(f"[green]ASSISTANT: {llm_sentence}")
         if self.device == "mps":
             import time
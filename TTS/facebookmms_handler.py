@@ -4,6 +4,8 @@ import numpy as np
 import librosa
 from rich.console import Console
 from baseHandler import BaseHandler
+from utils.speaking_rate import measure_speech
+from utils.quantization import quantize_dynamic_int8
 import logging
 
 logging.basicConfig(
@@ -65,14 +67,20 @@ class FacebookMMSTTSHandler(BaseHandler):
         language="en",
         stream=True,
         chunk_size=512,
+        quantize=None,
+        speaking_rate=None,
+        response_cache=None,
         **kwargs
     ):
         self.should_listen = should_listen
+        self.speaking_rate = speaking_rate
+        self.response_cache = response_cache
         self.device = device
         self.torch_dtype = getattr(torch, torch_dtype)
         self.stream = stream
         self.chunk_size = chunk_size
         self.language = language
+        self.quantize = quantize == "int8"
 
         self.load_model(self.language)
         self.warmup()
@@ -82,6 +90,8 @@ class FacebookMMSTTSHandler(BaseHandler):
             model_name = f"facebook/mms-tts-{WHISPER_LANGUAGE_TO_FACEBOOK_LANGUAGE[language_code]}"
             logger.info(f"Loading model: {model_name}")
             self.model = VitsModel.from_pretrained(model_name).to(self.device)
+            if self.quantize:
+                self.model = quantize_dynamic_int8(self.model, self.device)
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
             self.language = language_code
         except KeyError:
@@ -124,6 +134,12 @@ class FacebookMMSTTSHandler(BaseHandler):
             return None
 
     def process(self, llm_sentence):
+        audio_chunks = self.synthesize(llm_sentence)
+        if self.response_cache is not None:
+            audio_chunks = self.response_cache.synthesize(llm_sentence, audio_chunks, self.should_listen)
+        yield from measure_speech(self.speaking_rate, llm_sentence, audio_chunks)
+
+    def synthesize(self, llm_sentence):
         language_code = None
 
         if isinstance(llm_sentence, tuple):
@@ -1,6 +1,7 @@
 from melo.api import TTS
 import logging
 from baseHandler import BaseHandler
+from utils.speaking_rate import measure_speech
 import librosa
 import numpy as np
 from rich.console import Console
@@ -38,8 +39,12 @@ class MeloTTSHandler(BaseHandler):
         speaker_to_id="en",
         gen_kwargs={},  # Unused
         blocksize=512,
+        speaking_rate=None,
+        response_cache=None,
     ):
         self.should_listen = should_listen
+        self.speaking_rate = speaking_rate
+        self.response_cache = response_cache
         self.device = device
         self.language = language
         self.model = TTS(
@@ -56,6 +61,12 @@ class MeloTTSHandler(BaseHandler):
         _ = self.model.tts_to_file("text", self.speaker_id, quiet=True)
 
     def process(self, llm_sentence):
+        audio_chunks = self.synthesize(llm_sentence)
+        if self.response_cache is not None:
+            audio_chunks = self.response_cache.synthesize(llm_sentence, audio_chunks, self.should_listen)
+        yield from measure_speech(self.speaking_rate, llm_sentence, audio_chunks)
+
+    def synthesize(self, llm_sentence):
         language_code = None
 
         if isinstance(llm_sentence, tuple):
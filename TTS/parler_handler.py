@@ -1,6 +1,7 @@
 from threading import Thread
 from time import perf_counter
 from baseHandler import BaseHandler
+from utils.speaking_rate import measure_speech
 import numpy as np
 import torch
 from transformers import (
@@ -59,8 +60,12 @@ class ParlerTTSHandler(BaseHandler):
         play_steps_s=1,
         blocksize=512,
         use_default_speakers_list=True,
+        speaking_rate=None,
+        response_cache=None,
     ):
         self.should_listen = should_listen
+        self.speaking_rate = speaking_rate
+        self.response_cache = response_cache
         self.device = device
         self.torch_dtype = getattr(torch, torch_dtype)
         self.gen_kwargs = gen_kwargs
@@ -170,6 +175,12 @@ class ParlerTTSHandler(BaseHandler):
             )
 
     def process(self, llm_sentence):
+        audio_chunks = self.synthesize(llm_sentence)
+        if self.response_cache is not None:
+            audio_chunks = self.response_cache.synthesize(llm_sentence, audio_chunks, self.should_listen)
+        yield from measure_speech(self.speaking_rate, llm_sentence, audio_chunks)
+
+    def synthesize(self, llm_sentence):
         if isinstance(llm_sentence, tuple):
             llm_sentence, language_code = llm_sentence
             self.speaker = WHISPER_LANGUAGE_TO_PARLER_SPEAKER.get(language_code, "Jason")
@@ -5,6 +5,7 @@ import numpy as np
 import torch
 from rich.console import Console
 
+from utils.pipeline_events import SpeechChunk, SpeechStarted
 from utils.utils import int2float
 from df.enhance import enhance, init_df
 import logging
@@ -30,8 +31,16 @@ class VADHandler(BaseHandler):
         max_speech_ms=float("inf"),
         speech_pad_ms=30,
         audio_enhancement=False,
+        stream_speech_chunks=False,
+        prepare_queue=None,
     ):
         self.should_listen = should_listen
+        self.stream_speech_chunks = stream_speech_chunks
+        # the language model input queue, to signal the start of speech
+        self.prepare_queue = prepare_queue
+        self.speech_started = False
+        self.streamed_samples = 0
+        self.streamed_chunks = 0
         self.sample_rate = sample_rate
         self.min_silence_ms = min_silence_ms
         self.min_speech_ms = min_speech_ms
@@ -52,6 +61,10 @@ class VADHandler(BaseHandler):
         audio_int16 = np.frombuffer(audio_chunk, dtype=np.int16)
         audio_float32 = int2float(audio_int16)
         vad_output = self.iterator(torch.from_numpy(audio_float32))
+        if self.prepare_queue is not None:
+            self.signal_speech_start()
+        if self.stream_speech_chunks:
+            yield from self.stream_speech()
         if vad_output is not None and len(vad_output) != 0:
             logger.debug("VAD: end of speech detected")
             array = torch.cat(vad_output).cpu().numpy()
@@ -87,6 +100,28 @@ class VADHandler(BaseHandler):
                     array = enhanced.numpy().squeeze()
                 yield array
 
+    def signal_speech_start(self):
+        if self.iterator.triggered and not self.speech_started:
+            logger.debug("VAD: start of speech detected")
+            self.prepare_queue.put(SpeechStarted())
+        self.speech_started = self.iterator.triggered
+
+    def stream_speech(self):
+        """
+        Sends the speech accumulated by the iterator since the last call, while the user is speaking.
+        """
+        if not self.iterator.triggered:
+            self.streamed_samples = 0
+            self.streamed_chunks = 0
+            return
+
+        new_chunks = self.iterator.buffer[self.streamed_chunks :]
+        if new_chunks:
+            audio = torch.cat(new_chunks).cpu().numpy()
+            yield SpeechChunk(audio=audio, offset=self.streamed_samples)
+            self.streamed_chunks += len(new_chunks)
+            self.streamed_samples += len(audio)
+
     @property
     def min_time_to_debug(self):
         return 0.00001
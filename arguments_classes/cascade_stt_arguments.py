@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class CascadeSTTHandlerArguments:
+    cascade_stt_fast_model_name: str = field(
+        default="tiny.en",
+        metadata={
+            "help": "The Faster Whisper model transcribing every spoken prompt first. Default is 'tiny.en'."
+        },
+    )
+    cascade_stt_fast_device: str = field(
+        default="auto",
+        metadata={
+            "help": "The device on which the fast model will run. One of ('cpu', 'cuda', 'auto'). Default is 'auto'."
+        },
+    )
+    cascade_stt_fast_compute_type: str = field(
+        default="int8",
+        metadata={
+            "help": "The data type used by the fast model. Default is 'int8'."
+        },
+    )
+    cascade_stt_accurate_stt: str = field(
+        default="faster-whisper",
+        metadata={
+            "help": "The STT handling low confidence prompts, configured through its own arguments (e.g. --faster_whisper_stt_model_name large-v3). Either 'whisper', 'faster-whisper', 'paraformer' or 'moonshine'. Default is 'faster-whisper'."
+        },
+    )
+    cascade_stt_logprob_threshold: float = field(
+        default=-0.5,
+        metadata={
+            "help": "Prompts whose fast transcription has an average log probability below this value are transcribed again by the accurate STT. Default is -0.5."
+        },
+    )
+    cascade_stt_no_speech_threshold: float = field(
+        default=0.6,
+        metadata={
+            "help": "Low confidence prompts with a no speech probability above this value are considered silent and skipped. Default is 0.6."
+        },
+    )
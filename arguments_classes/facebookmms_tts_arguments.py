@@ -26,4 +26,10 @@ class FacebookMMSTTSHandlerArguments:
             "help": "The torch data type to use for the TTS model. Default is 'float32'."
         },
     )
+    facebook_mms_quantize: str = field(
+        default=None,
+        metadata={
+            "help": "Set to 'int8' to apply dynamic int8 quantization to the linear layers of the model at load time. CPU only. Default is None (no quantization)."
+        },
+    )
     
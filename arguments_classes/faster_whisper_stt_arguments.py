@@ -28,6 +28,12 @@ class FasterWhisperSTTHandlerArguments:
             Refer to 'https://opennmt.net/CTranslate2/quantization.html#quantize-on-model-loading'"""
         },
     )
+    faster_whisper_stt_batch_size: int = field(
+        default=8,
+        metadata={
+            "help": "Number of windows of spoken prompts longer than 30 s transcribed as one batch. Requires faster-whisper >= 1.1. Set to 1 to transcribe them sequentially. Default is 8."
+        },
+    )
     faster_whisper_stt_gen_max_new_tokens: int = field(
         default=128,
         metadata={
@@ -63,6 +63,108 @@ class LanguageModelHandlerArguments:
             "help": "Whether to use sampling; set this to False for deterministic outputs. Default is False."
         },
     )
+    lm_first_clause_min_words: int = field(
+        default=0,
+        metadata={
+            "help": "Emit the first segment of each response at the first clause boundary (comma, semicolon, colon) once it has at least this many words, so that the TTS starts earlier. Default is 0 (emit whole sentences only)."
+        },
+    )
+    lm_cache_system_prompt: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to keep the KV cache of the system prompt (init_chat_prompt), so that each turn only prefills the tokens following it. Default is True."
+        },
+    )
+    lm_session_kv_budget_mb: int = field(
+        default=0,
+        metadata={
+            "help": "Device memory (MB) for keeping the KV cache of each conversation between turns, so that a turn only prefills the new messages. The speech pipeline has a single conversation, several are only kept when prompts are sent with a session id (`(text, language_code, session_id)`). The least recently used caches are moved to host memory beyond it. Default is 0 (disabled)."
+        },
+    )
+    lm_max_sessions: int = field(
+        default=64,
+        metadata={
+            "help": "Maximum number of sessions (prompts sent with a session id) whose history is kept. The least recently used session is forgotten beyond it, with its KV cache. Default is 64."
+        },
+    )
+    lm_session_kv_host_budget_mb: int = field(
+        default=0,
+        metadata={
+            "help": "Host memory (MB) for the KV caches moved out of the device, the least recently used ones are dropped beyond it. Default is 0 (drop them right away)."
+        },
+    )
+    lm_chat_max_tokens: int = field(
+        default=0,
+        metadata={
+            "help": "Maximum number of tokens of the chat history, the oldest messages being dropped first. Default is 0 (only limited by the chat size)."
+        },
+    )
+    lm_pin_init_chat: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to always keep the initial chat prompt when the history exceeds the token limit, instead of dropping it first. Default is True."
+        },
+    )
+    lm_summarize_history: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to summarize the messages dropped from the chat history in a background thread, the summary replacing them in the prompt. Default is False."
+        },
+    )
+    lm_summary_max_new_tokens: int = field(
+        default=96,
+        metadata={
+            "help": "Maximum number of tokens of the running summary of the conversation. Default is 96."
+        },
+    )
+    lm_assistant_model_name: str = field(
+        default=None,
+        metadata={
+            "help": "Smaller model sharing the tokenizer of the language model, used as a draft model for assisted generation (speculative decoding). Default is None (no assistant)."
+        },
+    )
+    lm_compile_mode: str = field(
+        default=None,
+        metadata={
+            "help": "Compile mode for torch compile. Either 'default', 'reduce-overhead' and 'max-autotune'. Uses a static KV cache and pads the prompts to a few lengths. Default is None (no compilation)."
+        },
+    )
+    lm_prompt_length_buckets: str = field(
+        default="128,256,512,1024",
+        metadata={
+            "help": "Comma separated prompt lengths (in tokens) the prompts are left padded to when compiling, each being compiled during the warmup. Default is '128,256,512,1024'."
+        },
+    )
+    lm_prefill_on_speech_start: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to prefill the conversation history as soon as the VAD detects speech, and the partial transcripts of streaming STTs (e.g. streaming Paraformer), so that only the last tokens of the prompt remain to prefill at the end of the turn. Default is False."
+        },
+    )
+    lm_max_speech_s: float = field(
+        default=0,
+        metadata={
+            "help": "Maximum duration (s) of each response once spoken, converted into text with the speaking rate measured on the TTS. The generation stops at the end of the sentence exceeding it. Default is 0 (only limited by the maximum number of tokens)."
+        },
+    )
+    lm_rag_top_k: int = field(
+        default=0,
+        metadata={
+            "help": "Number of documents retrieved from the RAG vector store and added to each prompt, e.g. 3. The retriever and its embedding model are loaded once at setup and run while the prompt is prepared. Default is 0, retrieval disabled."
+        },
+    )
+    lm_rag_timeout_s: float = field(
+        default=0.5,
+        metadata={
+            "help": "Maximum time (s) to wait for the retrieved documents, the prompt is used without them past it. Default is 0.5."
+        },
+    )
+    lm_rag_backend: str = field(
+        default="chroma",
+        metadata={
+            "help": "Vector store of the RAG documents: 'chroma', or 'mmap' for the built-in memory-mapped IVF index (RAG/vector_index.py), which loads instantly and batches concurrent searches. Documents are added to the chosen store by `FileProcessor(backend).process_file`. Default is 'chroma'."
+        },
+    )
     chat_size: int = field(
         default=2,
         metadata={
@@ -57,6 +57,30 @@ class MLXLanguageModelHandlerArguments:
             "help": "Whether to use sampling; set this to False for deterministic outputs. Default is False."
         },
     )
+    mlx_lm_first_clause_min_words: int = field(
+        default=0,
+        metadata={
+            "help": "Emit the first segment of each response at the first clause boundary (comma, semicolon, colon) once it has at least this many words, so that the TTS starts earlier. Default is 0 (emit whole sentences only)."
+        },
+    )
+    mlx_lm_chat_max_tokens: int = field(
+        default=0,
+        metadata={
+            "help": "Maximum number of tokens of the chat history, the oldest messages being dropped first. Default is 0 (only limited by the chat size)."
+        },
+    )
+    mlx_lm_pin_init_chat: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to always keep the initial chat prompt when the history exceeds the token limit, instead of dropping it first. Default is True."
+        },
+    )
+    mlx_lm_max_speech_s: float = field(
+        default=0,
+        metadata={
+            "help": "Maximum duration (s) of each response once spoken, converted into text with the speaking rate measured on the TTS. The generation stops at the end of the sentence exceeding it. Default is 0 (only limited by the maximum number of tokens)."
+        },
+    )
     mlx_lm_chat_size: int = field(
         default=2,
         metadata={
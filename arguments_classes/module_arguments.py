@@ -8,6 +8,12 @@ class ModuleArguments:
         default=None,
         metadata={"help": "If specified, overrides the device for all handlers."},
     )
+    quantize: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "If specified, overrides the quantization of the STT and TTS handlers supporting it, e.g. 'int8' for CPU-only nodes."
+        },
+    )
     mode: Optional[str] = field(
         default="socket",
         metadata={
@@ -23,13 +29,13 @@ class ModuleArguments:
     stt: Optional[str] = field(
         default="whisper",
         metadata={
-            "help": "The STT to use. Either 'whisper', 'whisper-mlx', 'faster-whisper', and 'paraformer'. Default is 'whisper'."
+            "help": "The STT to use. Either 'whisper', 'whisper-mlx', 'faster-whisper', 'moonshine', 'paraformer', 'cascade' and 'router'. Default is 'whisper'."
         },
     )
     llm: Optional[str] = field(
         default="transformers",
         metadata={
-            "help": "The LLM to use. Either 'transformers' or 'mlx-lm'. Default is 'transformers'"
+            "help": "The LLM to use. Either 'transformers', 'open_api', 'mlx-lm' or 'router'. Default is 'transformers'"
         },
     )
     tts: Optional[str] = field(
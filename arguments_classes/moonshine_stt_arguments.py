@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MoonshineSTTHandlerArguments:
+    moonshine_stt_model_name: str = field(
+        default="moonshine/base",
+        metadata={
+            "help": "The pretrained Moonshine model to use. Either 'moonshine/tiny' or 'moonshine/base'. Default is 'moonshine/base'."
+        },
+    )
+    moonshine_stt_torch_dtype: str = field(
+        default="float32",
+        metadata={
+            "help": "The PyTorch data type of the input tensors. Use `float32` on CPU. Default is 'float32'."
+        },
+    )
+    moonshine_stt_quantize: str = field(
+        default=None,
+        metadata={
+            "help": "Set to 'int8' to quantize the weights of the encoder and decoder dense layers, which speeds up CPU inference. Default is None (no quantization)."
+        },
+    )
+    moonshine_stt_length_buckets_s: str = field(
+        default="2,4,8,16,32",
+        metadata={
+            "help": "Comma-separated lengths in seconds to which spoken prompts are zero-padded, so that the model only sees a few input shapes. Default is '2,4,8,16,32'."
+        },
+    )
+    moonshine_stt_max_batch_size: int = field(
+        default=4,
+        metadata={
+            "help": "Maximum number of queued spoken prompts transcribed as one batch. Default is 4."
+        },
+    )
+    moonshine_stt_language: str = field(
+        default="en",
+        metadata={
+            "help": "The language code passed along with the transcription. Moonshine models are English only. Default is 'en'."
+        },
+    )
@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field
+from typing import Optional
 
 
 @dataclass
@@ -36,6 +37,36 @@ class OpenApiLanguageModelHandlerArguments:
             "help": "Number of interactions assitant-user to keep for the chat. None for no limitations."
         },
     )
+    open_api_chat_max_tokens: int = field(
+        default=0,
+        metadata={
+            "help": "Maximum number of tokens of the chat history sent with each request, estimated from its length, the oldest messages being dropped first. Default is 0 (only limited by the chat size)."
+        },
+    )
+    open_api_pin_init_chat: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to always keep the initial chat prompt when the history exceeds the token limit, instead of dropping it first. Default is True."
+        },
+    )
+    open_api_first_clause_min_words: int = field(
+        default=0,
+        metadata={
+            "help": "Emit the first segment of each response at the first clause boundary (comma, semicolon, colon) once it has at least this many words, so that the TTS starts earlier. Default is 0 (emit whole sentences only)."
+        },
+    )
+    open_api_max_speech_s: float = field(
+        default=0,
+        metadata={
+            "help": "Maximum duration (s) of each response once spoken, converted into text with the speaking rate measured on the TTS. The generation stops at the end of the sentence exceeding it. Default is 0 (only limited by the maximum number of tokens)."
+        },
+    )
+    open_api_error_reply: str = field(
+        default="Sorry, I can't answer right now. Please try again.",
+        metadata={
+            "help": "Reply spoken when the request fails on every endpoint, so that the conversation goes on. Default is \"Sorry, I can't answer right now. Please try again.\"."
+        },
+    )
     open_api_api_key: str = field(
         default=None,
         metadata={
@@ -49,9 +80,52 @@ class OpenApiLanguageModelHandlerArguments:
         },
     )
     open_api_stream: bool = field(
-        default=False,
+        default=True,
         metadata={
             "help": "The stream parameter typically indicates whether data should be transmitted in a continuous flow rather"
-                    " than in a single, complete response, often used for handling large or real-time data.Default is False"
+                    " than in a single, complete response, often used for handling large or real-time data. Sentences are"
+                    " then sent to the TTS as soon as they are complete. Default is True"
         },
-    )
\ No newline at end of file
+    )
+    open_api_max_connections: int = field(
+        default=4,
+        metadata={
+            "help": "Maximum number of HTTP connections to the API, kept alive between requests. Default is 4."
+        },
+    )
+    open_api_endpoints: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Comma-separated OpenAI-compatible endpoints ordered by preference, as `model_name@base_url`, e.g. 'gpt-4o-mini@https://api.openai.com/v1,llama3.1:8b@http://localhost:11434/v1'. Overrides the model name and base URL. Default is None (only use them)."
+        },
+    )
+    open_api_hedge_percentile: float = field(
+        default=95,
+        metadata={
+            "help": "Percentile of the recent first token latencies of an endpoint after which a request without a first token is duplicated on the next endpoint, the first to answer being used. 0 disables hedging. Default is 95."
+        },
+    )
+    open_api_hedge_delay_s: float = field(
+        default=1.0,
+        metadata={
+            "help": "Hedging delay (s) used until enough latencies of the endpoint are known. Default is 1.0."
+        },
+    )
+    open_api_hedge_max_requests: int = field(
+        default=2,
+        metadata={
+            "help": "Maximum number of requests sent for a prompt: the original one, its hedges and its failovers. Default is 2."
+        },
+    )
+    open_api_circuit_max_failures: int = field(
+        default=3,
+        metadata={
+            "help": "Number of consecutive errors or lost hedges after which an endpoint isn't used for `open_api_circuit_cooldown_s`. Default is 3."
+        },
+    )
+    open_api_circuit_cooldown_s: float = field(
+        default=30.0,
+        metadata={
+            "help": "Time (s) during which an endpoint isn't used after too many failures. Default is 30."
+        },
+    )
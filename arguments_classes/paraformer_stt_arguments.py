@@ -15,3 +15,15 @@ class ParaformerSTTHandlerArguments:
             "help": "The device type on which the model will run. Default is 'cuda' for GPU acceleration."
         },
     )
+    paraformer_stt_streaming: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to transcribe speech chunk by chunk while the user is speaking, only finalizing at the end of speech. Requires a streaming model such as 'paraformer-zh-streaming'. Default is False."
+        },
+    )
+    paraformer_stt_chunk_size_ms: int = field(
+        default=600,
+        metadata={
+            "help": "Duration of the chunks fed to the streaming model, in multiples of 60 ms. 600 ms and 480 ms are the configurations of FunASR's streaming models. Default is 600."
+        },
+    )
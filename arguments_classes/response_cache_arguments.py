@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ResponseCacheArguments:
+    response_cache_max_entries: int = field(
+        default=0,
+        metadata={
+            "help": "Maximum number of responses kept in the semantic response cache, keyed by the embedding of the transcribed prompt. Near-identical questions are then answered with the cached response and its pre-rendered audio, without running the LLM and the TTS. Meant for stateless FAQ-style prompts. Default is 0 (no cache)."
+        },
+    )
+    response_cache_model_name: str = field(
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        metadata={
+            "help": "The pretrained sentence embedding model used to embed the prompts. Default is 'sentence-transformers/all-MiniLM-L6-v2'."
+        },
+    )
+    response_cache_device: str = field(
+        default="cpu",
+        metadata={
+            "help": "The device type on which the embedding model will run. Default is 'cpu'."
+        },
+    )
+    response_cache_similarity_threshold: float = field(
+        default=0.9,
+        metadata={
+            "help": "Minimum cosine similarity between the embeddings of two prompts for the cached response to be used. Lower values match more loosely related questions. Default is 0.9."
+        },
+    )
+    response_cache_ttl_s: float = field(
+        default=3600.0,
+        metadata={
+            "help": "Time (s) after which a cached response expires. Default is 3600."
+        },
+    )
+    response_cache_min_words: int = field(
+        default=3,
+        metadata={
+            "help": "Prompts with fewer words (e.g. 'yes', 'why?') depend on the conversation and bypass the cache. Default is 3."
+        },
+    )
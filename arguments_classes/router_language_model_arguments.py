@@ -0,0 +1,30 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class RouterLanguageModelHandlerArguments:
+    router_lm_tiers: str = field(
+        default="small=transformers:HuggingFaceTB/SmolLM2-360M-Instruct,large=transformers:microsoft/Phi-3-mini-4k-instruct",
+        metadata={
+            "help": "Comma-separated language model tiers ordered by increasing capacity, as `tier=backend:model_name`. Backends are 'transformers', 'open_api' or 'mlx-lm' and are configured through their own arguments, apart from the model name. Default is 'small=transformers:HuggingFaceTB/SmolLM2-360M-Instruct,large=transformers:microsoft/Phi-3-mini-4k-instruct'."
+        },
+    )
+    router_lm_thresholds: str = field(
+        default="0.4",
+        metadata={
+            "help": "Comma-separated increasing complexity thresholds between consecutive tiers, one less than the number of tiers. A prompt goes to the first tier whose threshold is above its complexity score, in [0, 1]. Default is '0.4'."
+        },
+    )
+    router_lm_classifier_model_name: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Sequence classification model whose last label probability is used as complexity score. Default is None (score prompts from their length and keywords)."
+        },
+    )
+    router_lm_classifier_device: str = field(
+        default="cpu",
+        metadata={
+            "help": "The device type on which the classifier will run. Default is 'cpu'."
+        },
+    )
@@ -0,0 +1,54 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class RouterSTTHandlerArguments:
+    router_stt_backends: str = field(
+        default="en=faster-whisper:tiny.en,zh=paraformer:paraformer-zh,*=faster-whisper:large-v3",
+        metadata={
+            "help": "Comma-separated routes from language to STT backend, as `language=backend:model_name[@memory_mb]`. Backends are 'whisper', 'faster-whisper', 'paraformer' or 'moonshine' and are configured through their own arguments, apart from the model name. The `*` route handles the other languages. Default is 'en=faster-whisper:tiny.en,zh=paraformer:paraformer-zh,*=faster-whisper:large-v3'."
+        },
+    )
+    router_stt_language: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Language hint for the session. If set, no language detection is run. Default is None (detect the language)."
+        },
+    )
+    router_stt_redetect: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to detect the language of every spoken prompt instead of once per session. Default is False."
+        },
+    )
+    router_stt_session_timeout_s: float = field(
+        default=60,
+        metadata={
+            "help": "Silence in seconds after which the session ends and the language of the next spoken prompt is detected again. Default is 60."
+        },
+    )
+    router_stt_detector_model_name: str = field(
+        default="tiny",
+        metadata={
+            "help": "The multilingual Faster Whisper model used for language detection. Default is 'tiny'."
+        },
+    )
+    router_stt_detector_device: str = field(
+        default="auto",
+        metadata={
+            "help": "The device on which the language detection model will run. One of ('cpu', 'cuda', 'auto'). Default is 'auto'."
+        },
+    )
+    router_stt_detector_compute_type: str = field(
+        default="int8",
+        metadata={
+            "help": "The data type used by the language detection model. Default is 'int8'."
+        },
+    )
+    router_stt_memory_budget_mb: float = field(
+        default=6000,
+        metadata={
+            "help": "Memory budget of the loaded STT backends in MB. The least recently used backends are evicted above it. Default is 6000."
+        },
+    )
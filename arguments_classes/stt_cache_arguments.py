@@ -0,0 +1,29 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class STTCacheArguments:
+    stt_cache_max_entries: int = field(
+        default=0,
+        metadata={
+            "help": "Maximum number of transcriptions kept in the STT cache, keyed by audio fingerprint. Repeated utterances are then answered without running the STT model. Default is 0 (no cache)."
+        },
+    )
+    stt_cache_n_bands: int = field(
+        default=16,
+        metadata={
+            "help": "Number of mel bands of the audio fingerprint. Default is 16."
+        },
+    )
+    stt_cache_n_frames: int = field(
+        default=32,
+        metadata={
+            "help": "Number of time frames the audio fingerprint is pooled to. Default is 32."
+        },
+    )
+    stt_cache_max_bit_error_rate: float = field(
+        default=0.2,
+        metadata={
+            "help": "Maximum fraction of differing fingerprint bits for a cached utterance to match. Higher values match more distant repeats. Default is 0.2."
+        },
+    )
@@ -28,6 +28,36 @@ class WhisperSTTHandlerArguments:
             "help": "Compile mode for torch compile. Either 'default', 'reduce-overhead' and 'max-autotune'. Default is None (no compilation)"
         },
     )
+    stt_assistant_model_name: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Smaller model used as assistant for speculative decoding, e.g. 'distil-whisper/distil-large-v3' for 'openai/whisper-large-v3'. Default is None (no speculative decoding)."
+        },
+    )
+    stt_assistant_shares_encoder: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether the assistant model shares the encoder of the main model, in which case only its decoder is loaded and the encoder outputs are reused. Set to False for an assistant with its own encoder, e.g. 'openai/whisper-tiny'. Default is True."
+        },
+    )
+    stt_long_form_chunking: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to split spoken prompts longer than 30 s at low energy points into overlapping windows transcribed as one batch, instead of truncating them. Default is True."
+        },
+    )
+    stt_chunk_overlap_s: float = field(
+        default=1.0,
+        metadata={
+            "help": "Overlap in seconds between consecutive windows of long spoken prompts. Repeated words in the overlap are removed when merging the transcripts. Default is 1.0."
+        },
+    )
+    stt_quantize: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Set to 'int8' to apply dynamic int8 quantization to the linear layers of the model at load time. CPU only. Default is None (no quantization)."
+        },
+    )
     stt_gen_max_new_tokens: int = field(
         default=128,
         metadata={
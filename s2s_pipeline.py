@@ -1,7 +1,7 @@
 import logging
 import os
 import sys
-from copy import copy
+from copy import copy, deepcopy
 from pathlib import Path
 from queue import Queue
 from threading import Event
@@ -23,6 +23,12 @@ from arguments_classes.whisper_stt_arguments import WhisperSTTHandlerArguments
 from arguments_classes.faster_whisper_stt_arguments import (
     FasterWhisperSTTHandlerArguments,
 )
+from arguments_classes.moonshine_stt_arguments import MoonshineSTTHandlerArguments
+from arguments_classes.stt_cache_arguments import STTCacheArguments
+from arguments_classes.cascade_stt_arguments import CascadeSTTHandlerArguments
+from arguments_classes.router_stt_arguments import RouterSTTHandlerArguments
+from arguments_classes.router_language_model_arguments import RouterLanguageModelHandlerArguments
+from arguments_classes.response_cache_arguments import ResponseCacheArguments
 from arguments_classes.melo_tts_arguments import MeloTTSHandlerArguments
 from arguments_classes.open_api_language_model_arguments import OpenApiLanguageModelHandlerArguments
 from arguments_classes.facebookmms_tts_arguments import FacebookMMSTTSHandlerArguments
@@ -33,13 +39,10 @@ from transformers import (
     HfArgumentParser,
 )
 
+from utils.speaking_rate import SpeakingRate
 from utils.thread_manager import ThreadManager
 
 # Ensure that the necessary NLTK resources are available
-try:
-    nltk.data.find("tokenizers/punkt_tab")
-except (LookupError, OSError):
-    nltk.download("punkt_tab")
 try:
     nltk.data.find("tokenizers/averaged_perceptron_tagger_eng")
 except (LookupError, OSError):
@@ -81,9 +84,15 @@ def parse_arguments():
             WhisperSTTHandlerArguments,
             ParaformerSTTHandlerArguments,
             FasterWhisperSTTHandlerArguments,
+            MoonshineSTTHandlerArguments,
+            STTCacheArguments,
+            CascadeSTTHandlerArguments,
+            RouterSTTHandlerArguments,
             LanguageModelHandlerArguments,
             OpenApiLanguageModelHandlerArguments,
             MLXLanguageModelHandlerArguments,
+            RouterLanguageModelHandlerArguments,
+            ResponseCacheArguments,
             ParlerTTSHandlerArguments,
             MeloTTSHandlerArguments,
             ChatTTSHandlerArguments,
@@ -158,11 +167,26 @@ def overwrite_device_argument(common_device: Optional[str], *handler_kwargs):
                 kwargs.facebook_mms_device = common_device
 
 
+def overwrite_quantize_argument(common_quantize: Optional[str], *handler_kwargs):
+    if common_quantize:
+        for kwargs in handler_kwargs:
+            if hasattr(kwargs, "stt_quantize"):
+                kwargs.stt_quantize = common_quantize
+            if hasattr(kwargs, "moonshine_stt_quantize"):
+                kwargs.moonshine_stt_quantize = common_quantize
+            if hasattr(kwargs, "faster_whisper_stt_compute_type"):
+                # CTranslate2 quantizes at load time given the compute type
+                kwargs.faster_whisper_stt_compute_type = common_quantize
+            if hasattr(kwargs, "facebook_mms_quantize"):
+                kwargs.facebook_mms_quantize = common_quantize
+
+
 def prepare_module_args(module_kwargs, *handler_kwargs):
     optimal_mac_settings(module_kwargs.local_mac_optimal_settings, module_kwargs)
     if platform == "darwin":
         check_mac_settings(module_kwargs)
     overwrite_device_argument(module_kwargs.device, *handler_kwargs)
+    overwrite_quantize_argument(module_kwargs.quantize, *handler_kwargs)
 
 
 def prepare_all_args(
@@ -170,9 +194,15 @@ def prepare_all_args(
     whisper_stt_handler_kwargs,
     paraformer_stt_handler_kwargs,
     faster_whisper_stt_handler_kwargs,
+    moonshine_stt_handler_kwargs,
+    stt_cache_kwargs,
+    cascade_stt_handler_kwargs,
+    router_stt_handler_kwargs,
     language_model_handler_kwargs,
     open_api_language_model_handler_kwargs,
     mlx_language_model_handler_kwargs,
+    router_lm_kwargs,
+    response_cache_kwargs,
     parler_tts_handler_kwargs,
     melo_tts_handler_kwargs,
     chat_tts_handler_kwargs,
@@ -183,6 +213,7 @@ def prepare_all_args(
         whisper_stt_handler_kwargs,
         faster_whisper_stt_handler_kwargs,
         paraformer_stt_handler_kwargs,
+        moonshine_stt_handler_kwargs,
         language_model_handler_kwargs,
         open_api_language_model_handler_kwargs,
         mlx_language_model_handler_kwargs,
@@ -195,9 +226,15 @@ def prepare_all_args(
     rename_args(whisper_stt_handler_kwargs, "stt")
     rename_args(faster_whisper_stt_handler_kwargs, "faster_whisper_stt")
     rename_args(paraformer_stt_handler_kwargs, "paraformer_stt")
+    rename_args(moonshine_stt_handler_kwargs, "moonshine_stt")
+    rename_args(stt_cache_kwargs, "stt_cache")
+    rename_args(cascade_stt_handler_kwargs, "cascade_stt")
+    rename_args(router_stt_handler_kwargs, "router_stt")
     rename_args(language_model_handler_kwargs, "lm")
     rename_args(mlx_language_model_handler_kwargs, "mlx_lm")
     rename_args(open_api_language_model_handler_kwargs, "open_api")
+    rename_args(router_lm_kwargs, "router_lm")
+    rename_args(response_cache_kwargs, "response_cache")
     rename_args(parler_tts_handler_kwargs, "tts")
     rename_args(melo_tts_handler_kwargs, "melo")
     rename_args(chat_tts_handler_kwargs, "chat_tts")
@@ -224,9 +261,15 @@ def build_pipeline(
     whisper_stt_handler_kwargs,
     faster_whisper_stt_handler_kwargs,
     paraformer_stt_handler_kwargs,
+    moonshine_stt_handler_kwargs,
+    stt_cache_kwargs,
+    cascade_stt_handler_kwargs,
+    router_stt_handler_kwargs,
     language_model_handler_kwargs,
     open_api_language_model_handler_kwargs,
     mlx_language_model_handler_kwargs,
+    router_lm_kwargs,
+    response_cache_kwargs,
     parler_tts_handler_kwargs,
     melo_tts_handler_kwargs,
     chat_tts_handler_kwargs,
@@ -269,30 +312,146 @@ def build_pipeline(
             ),
         ]
 
+    # only the streaming Paraformer handles speech chunks, the other STT handlers expect complete utterances
+    if module_kwargs.stt == "paraformer" and paraformer_stt_handler_kwargs.streaming:
+        vad_handler_kwargs.stream_speech_chunks = True
+
+    # measured by the TTS, used by the language model to bound the duration of its responses
+    speaking_rate = SpeakingRate()
+    for handler_kwargs in (
+        language_model_handler_kwargs,
+        open_api_language_model_handler_kwargs,
+        mlx_language_model_handler_kwargs,
+        parler_tts_handler_kwargs,
+        melo_tts_handler_kwargs,
+        chat_tts_handler_kwargs,
+        facebook_mms_tts_handler_kwargs,
+    ):
+        handler_kwargs.speaking_rate = speaking_rate
+
+    # filled by the language model stage, the TTS records and replays the audio of the cached responses
+    response_cache = None
+    if response_cache_kwargs.max_entries > 0:
+        from LLM.response_cache import ResponseCache
+        response_cache = ResponseCache(
+            max_entries=response_cache_kwargs.max_entries, ttl_s=response_cache_kwargs.ttl_s
+        )
+    for handler_kwargs in (
+        parler_tts_handler_kwargs,
+        melo_tts_handler_kwargs,
+        chat_tts_handler_kwargs,
+        facebook_mms_tts_handler_kwargs,
+    ):
+        handler_kwargs.response_cache = response_cache
+
+    vad_setup_kwargs = vars(vad_handler_kwargs)
+    if module_kwargs.llm in ("transformers", "router") and language_model_handler_kwargs.prefill_on_speech_start:
+        # the start of speech bypasses the STT
+        vad_setup_kwargs = {**vad_setup_kwargs, "prepare_queue": text_prompt_queue}
+
     vad = VADHandler(
         stop_event,
         queue_in=recv_audio_chunks_queue,
         queue_out=spoken_prompt_queue,
         setup_args=(should_listen,),
-        setup_kwargs=vars(vad_handler_kwargs),
+        setup_kwargs=vad_setup_kwargs,
     )
 
-    stt = get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs)
-    lm = get_llm_handler(module_kwargs, stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs)
+    stt = get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, stt_cache_kwargs, cascade_stt_handler_kwargs, router_stt_handler_kwargs)
+    lm = get_llm_handler(module_kwargs, stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs, router_lm_kwargs, response_cache, response_cache_kwargs)
     tts = get_tts_handler(module_kwargs, stop_event, lm_response_queue, send_audio_chunks_queue, should_listen, parler_tts_handler_kwargs, melo_tts_handler_kwargs, chat_tts_handler_kwargs, facebook_mms_tts_handler_kwargs)
 
     return ThreadManager([*comms_handlers, vad, stt, lm, tts])
 
 
-def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs):
-    if module_kwargs.stt == "moonshine":
+def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, stt_cache_kwargs, cascade_stt_handler_kwargs, router_stt_handler_kwargs):
+    # a handler wrapped by the cache is only used through it: without queues, so that it can't take the prompts
+    # queued behind the current one (as Moonshine does to batch them) past the cache
+    cached = stt_cache_kwargs.max_entries > 0
+    stt_queue_in = None if cached else spoken_prompt_queue
+    stt_queue_out = None if cached else text_prompt_queue
+    if module_kwargs.stt == "cascade":
+        stt = get_cascade_stt_handler(stop_event, stt_queue_in, stt_queue_out, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, cascade_stt_handler_kwargs)
+    elif module_kwargs.stt == "router":
+        stt = get_router_stt_handler(stop_event, stt_queue_in, stt_queue_out, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, router_stt_handler_kwargs)
+    else:
+        stt = build_stt_handler(module_kwargs.stt, stop_event, stt_queue_in, stt_queue_out, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs)
+    if cached:
+        from STT.stt_cache import CachedSTTHandler
+        return CachedSTTHandler(
+            stop_event,
+            queue_in=spoken_prompt_queue,
+            queue_out=text_prompt_queue,
+            setup_args=(stt,),
+            setup_kwargs=vars(stt_cache_kwargs),
+        )
+    return stt
+
+
+def get_cascade_stt_handler(stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, cascade_stt_handler_kwargs):
+    from STT.cascade_stt_handler import CascadeSTTHandler
+    from STT.faster_whisper_handler import FasterWhisperSTTHandler
+
+    # the tiers are only used through the cascade, hence they don't need queues
+    fast_handler = FasterWhisperSTTHandler(
+        stop_event,
+        queue_in=None,
+        queue_out=None,
+        setup_kwargs={
+            "model_name": cascade_stt_handler_kwargs.fast_model_name,
+            "device": cascade_stt_handler_kwargs.fast_device,
+            "compute_type": cascade_stt_handler_kwargs.fast_compute_type,
+            "gen_kwargs": dict(faster_whisper_stt_handler_kwargs.gen_kwargs),
+        },
+    )
+    accurate_handler = build_stt_handler(cascade_stt_handler_kwargs.accurate_stt, stop_event, None, None, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs)
+
+    return CascadeSTTHandler(
+        stop_event,
+        queue_in=spoken_prompt_queue,
+        queue_out=text_prompt_queue,
+        setup_args=(fast_handler, accurate_handler),
+        setup_kwargs={
+            "logprob_threshold": cascade_stt_handler_kwargs.logprob_threshold,
+            "no_speech_threshold": cascade_stt_handler_kwargs.no_speech_threshold,
+        },
+    )
+
+
+def get_router_stt_handler(stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs, router_stt_handler_kwargs):
+    from STT.router_stt_handler import RouterSTTHandler
+
+    def load_backend(backend, model_name, language):
+        # each backend gets its own copy of the arguments, with the model name and language of its route
+        whisper_kwargs = deepcopy(whisper_stt_handler_kwargs)
+        faster_whisper_kwargs = deepcopy(faster_whisper_stt_handler_kwargs)
+        paraformer_kwargs = deepcopy(paraformer_stt_handler_kwargs)
+        moonshine_kwargs = deepcopy(moonshine_stt_handler_kwargs)
+        for kwargs in (whisper_kwargs, faster_whisper_kwargs, paraformer_kwargs, moonshine_kwargs):
+            kwargs.model_name = model_name
+        whisper_kwargs.language = language
+        faster_whisper_kwargs.gen_kwargs["language"] = language
+        return build_stt_handler(backend, stop_event, None, None, whisper_kwargs, faster_whisper_kwargs, paraformer_kwargs, moonshine_kwargs)
+
+    return RouterSTTHandler(
+        stop_event,
+        queue_in=spoken_prompt_queue,
+        queue_out=text_prompt_queue,
+        setup_args=(load_backend,),
+        setup_kwargs=vars(router_stt_handler_kwargs),
+    )
+
+
+def build_stt_handler(stt_name, stop_event, spoken_prompt_queue, text_prompt_queue, whisper_stt_handler_kwargs, faster_whisper_stt_handler_kwargs, paraformer_stt_handler_kwargs, moonshine_stt_handler_kwargs):
+    if stt_name == "moonshine":
         from STT.moonshine_handler import MoonshineSTTHandler
         return MoonshineSTTHandler(
             stop_event,
             queue_in=spoken_prompt_queue,
             queue_out=text_prompt_queue,
+            setup_kwargs=vars(moonshine_stt_handler_kwargs),
         )
-    if module_kwargs.stt == "whisper":
+    if stt_name == "whisper":
         from STT.whisper_stt_handler import WhisperSTTHandler
         return WhisperSTTHandler(
             stop_event,
@@ -300,7 +459,7 @@ def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_
             queue_out=text_prompt_queue,
             setup_kwargs=vars(whisper_stt_handler_kwargs),
         )
-    elif module_kwargs.stt == "whisper-mlx":
+    elif stt_name == "whisper-mlx":
         from STT.lightning_whisper_mlx_handler import LightningWhisperSTTHandler
         return LightningWhisperSTTHandler(
             stop_event,
@@ -308,7 +467,7 @@ def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_
             queue_out=text_prompt_queue,
             setup_kwargs=vars(whisper_stt_handler_kwargs),
         )
-    elif module_kwargs.stt == "paraformer":
+    elif stt_name == "paraformer":
         from STT.paraformer_handler import ParaformerSTTHandler
         return ParaformerSTTHandler(
             stop_event,
@@ -316,7 +475,7 @@ def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_
             queue_out=text_prompt_queue,
             setup_kwargs=vars(paraformer_stt_handler_kwargs),
         )
-    elif module_kwargs.stt == "faster-whisper":
+    elif stt_name == "faster-whisper":
         from STT.faster_whisper_handler import FasterWhisperSTTHandler
 
         return FasterWhisperSTTHandler(
@@ -326,7 +485,7 @@ def get_stt_handler(module_kwargs, stop_event, spoken_prompt_queue, text_prompt_
             setup_kwargs=vars(faster_whisper_stt_handler_kwargs),
         )
     else:
-        raise ValueError("The STT should be either whisper, whisper-mlx, or paraformer.")
+        raise ValueError("The STT should be either whisper, whisper-mlx, faster-whisper, moonshine, paraformer, cascade or router.")
 
 
 def get_llm_handler(
@@ -336,9 +495,58 @@ def get_llm_handler(
     lm_response_queue, 
     language_model_handler_kwargs,
     open_api_language_model_handler_kwargs,
-    mlx_language_model_handler_kwargs
+    mlx_language_model_handler_kwargs,
+    router_lm_kwargs=None,
+    response_cache=None,
+    response_cache_kwargs=None,
 ):
-    if module_kwargs.llm == "transformers":
+    if module_kwargs.llm == "router":
+        lm = get_router_llm_handler(stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs, router_lm_kwargs)
+    else:
+        lm = build_llm_handler(module_kwargs.llm, stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs)
+
+    if response_cache is not None:
+        from LLM.response_cache import CachedLanguageModelHandler
+        return CachedLanguageModelHandler(
+            stop_event,
+            queue_in=text_prompt_queue,
+            queue_out=lm_response_queue,
+            setup_args=(lm, response_cache),
+            setup_kwargs={
+                "model_name": response_cache_kwargs.model_name,
+                "device": response_cache_kwargs.device,
+                "similarity_threshold": response_cache_kwargs.similarity_threshold,
+                "min_words": response_cache_kwargs.min_words,
+            },
+        )
+    return lm
+
+
+def get_router_llm_handler(stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs, router_lm_kwargs):
+    from LLM.router_language_model import RouterLanguageModelHandler
+
+    def load_backend(backend, model_name):
+        # each tier gets its own copy of the arguments, with the model name of the tier
+        # (shallow copies, the speaking rate is shared)
+        lm_kwargs = copy(language_model_handler_kwargs)
+        open_api_kwargs = copy(open_api_language_model_handler_kwargs)
+        mlx_kwargs = copy(mlx_language_model_handler_kwargs)
+        for kwargs in (lm_kwargs, open_api_kwargs, mlx_kwargs):
+            kwargs.model_name = model_name
+            kwargs.gen_kwargs = dict(kwargs.gen_kwargs)
+        return build_llm_handler(backend, stop_event, None, None, lm_kwargs, open_api_kwargs, mlx_kwargs)
+
+    return RouterLanguageModelHandler(
+        stop_event,
+        queue_in=text_prompt_queue,
+        queue_out=lm_response_queue,
+        setup_args=(load_backend,),
+        setup_kwargs=vars(router_lm_kwargs),
+    )
+
+
+def build_llm_handler(llm_name, stop_event, text_prompt_queue, lm_response_queue, language_model_handler_kwargs, open_api_language_model_handler_kwargs, mlx_language_model_handler_kwargs):
+    if llm_name == "transformers":
         from LLM.language_model import LanguageModelHandler
         return LanguageModelHandler(
             stop_event,
@@ -346,7 +554,7 @@ def get_llm_handler(
             queue_out=lm_response_queue,
             setup_kwargs=vars(language_model_handler_kwargs),
         )
-    elif module_kwargs.llm == "open_api":
+    elif llm_name == "open_api":
         from LLM.openai_api_language_model import OpenApiModelHandler
         return OpenApiModelHandler(
             stop_event,
@@ -355,7 +563,7 @@ def get_llm_handler(
             setup_kwargs=vars(open_api_language_model_handler_kwargs),
         )
 
-    elif module_kwargs.llm == "mlx-lm":
+    elif llm_name == "mlx-lm":
         from LLM.mlx_language_model import MLXLanguageModelHandler
         return MLXLanguageModelHandler(
             stop_event,
@@ -365,7 +573,7 @@ def get_llm_handler(
         )
 
     else:
-        raise ValueError("The LLM should be either transformers or mlx-lm")
+        raise ValueError("The LLM should be either transformers, open_api, mlx-lm or router")
 
 
 def get_tts_handler(module_kwargs, stop_event, lm_response_queue, send_audio_chunks_queue, should_listen, parler_tts_handler_kwargs, melo_tts_handler_kwargs, chat_tts_handler_kwargs, facebook_mms_tts_handler_kwargs):
@@ -428,9 +636,15 @@ def main():
         whisper_stt_handler_kwargs,
         paraformer_stt_handler_kwargs,
         faster_whisper_stt_handler_kwargs,  # Add this line
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
         language_model_handler_kwargs,
         open_api_language_model_handler_kwargs,
         mlx_language_model_handler_kwargs,
+        router_lm_kwargs,
+        response_cache_kwargs,
         parler_tts_handler_kwargs,
         melo_tts_handler_kwargs,
         chat_tts_handler_kwargs,
@@ -444,9 +658,15 @@ def main():
         whisper_stt_handler_kwargs,
         paraformer_stt_handler_kwargs,
         faster_whisper_stt_handler_kwargs,  # Add this line
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
         language_model_handler_kwargs,
         open_api_language_model_handler_kwargs,
         mlx_language_model_handler_kwargs,
+        router_lm_kwargs,
+        response_cache_kwargs,
         parler_tts_handler_kwargs,
         melo_tts_handler_kwargs,
         chat_tts_handler_kwargs,
@@ -463,9 +683,15 @@ def main():
         whisper_stt_handler_kwargs,
         faster_whisper_stt_handler_kwargs,  # Add this line
         paraformer_stt_handler_kwargs,
+        moonshine_stt_handler_kwargs,
+        stt_cache_kwargs,
+        cascade_stt_handler_kwargs,
+        router_stt_handler_kwargs,
         language_model_handler_kwargs,
         open_api_language_model_handler_kwargs,
         mlx_language_model_handler_kwargs,
+        router_lm_kwargs,
+        response_cache_kwargs,
         parler_tts_handler_kwargs,
         melo_tts_handler_kwargs,
         chat_tts_handler_kwargs,
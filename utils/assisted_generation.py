@@ -0,0 +1,116 @@
+import logging
+from contextlib import contextmanager
+from threading import get_ident
+
+logger = logging.getLogger(__name__)
+
+
+class AssistedGenerationStats:
+    """
+    Tracks how well an assistant (draft) model performs during assisted generation.
+
+    Forward hooks count the calls made to the main and the assistant model during a `generate` call, which must run
+    within `track()`: other uses of the models (warmup, prefills, other generations) aren't counted.
+    Each main model call verifies the drafted tokens and produces one token of its own, hence:
+        - accepted draft tokens = new tokens - main model calls
+        - acceptance rate = accepted draft tokens / assistant model calls
+        - speedup = new tokens / main model calls (i.e. tokens produced per forward pass of the main model)
+    """
+
+    def __init__(self, model, assistant_model, input_ids_key="input_ids"):
+        self.input_ids_key = input_ids_key
+        self.turns = 0
+        self.total_new_tokens = 0
+        self.total_model_calls = 0
+        self.total_assistant_calls = 0
+        self.total_elapsed = 0.0
+        # thread running the tracked generate call, None when not tracking
+        self.tracked_thread = None
+        self.reset()
+
+        model.register_forward_pre_hook(self._on_model_call, with_kwargs=True)
+        assistant_model.register_forward_pre_hook(self._on_assistant_call)
+
+    def reset(self):
+        self.model_calls = 0
+        self.assistant_calls = 0
+        self.prompt_length = None
+
+    @contextmanager
+    def track(self):
+        """
+        Counts the model calls made by the current thread within this context.
+        """
+        self.tracked_thread = get_ident()
+        try:
+            yield
+        finally:
+            self.tracked_thread = None
+
+    def _is_tracked(self):
+        return self.tracked_thread == get_ident()
+
+    def _on_model_call(self, module, args, kwargs):
+        if not self._is_tracked():
+            return
+        if self.model_calls == 0:
+            input_ids = kwargs.get(self.input_ids_key)
+            if input_ids is not None:
+                self.prompt_length = input_ids.shape[-1]
+        self.model_calls += 1
+
+    def _on_assistant_call(self, module, args):
+        if self._is_tracked():
+            self.assistant_calls += 1
+
+    def update(self, sequence_length, prompt_length=None, elapsed=None):
+        """
+        Records the `generate` call that just finished, given the length of the returned sequence (prompt included).
+        prompt_length defaults to the length of the first main model input, which is too short when part of the prompt
+        was cached. elapsed, the duration of the call, is used to report the tokens per second.
+        Returns the number of new tokens, the acceptance rate and the speedup of this call.
+        """
+        if prompt_length is None:
+            prompt_length = self.prompt_length or 0
+        new_tokens = sequence_length - prompt_length
+        acceptance_rate = self._acceptance_rate(new_tokens, self.model_calls, self.assistant_calls)
+        speedup = new_tokens / self.model_calls if self.model_calls else 0.0
+
+        self.turns += 1
+        self.total_new_tokens += new_tokens
+        self.total_model_calls += self.model_calls
+        self.total_assistant_calls += self.assistant_calls
+        if elapsed is not None:
+            self.total_elapsed += elapsed
+        self.reset()
+
+        return new_tokens, acceptance_rate, speedup
+
+    @staticmethod
+    def _acceptance_rate(new_tokens, model_calls, assistant_calls):
+        if not assistant_calls:
+            return 0.0
+        return min(max(new_tokens - model_calls, 0) / assistant_calls, 1.0)
+
+    @property
+    def acceptance_rate(self):
+        return self._acceptance_rate(
+            self.total_new_tokens, self.total_model_calls, self.total_assistant_calls
+        )
+
+    @property
+    def speedup(self):
+        if not self.total_model_calls:
+            return 0.0
+        return self.total_new_tokens / self.total_model_calls
+
+    def log_summary(self, name):
+        if self.turns:
+            tokens_per_second = (
+                f", tokens/s: {self.total_new_tokens / self.total_elapsed:.1f}" if self.total_elapsed else ""
+            )
+            logger.info(
+                f"{name}: assisted generation over {self.turns} calls, "
+                f"acceptance rate: {self.acceptance_rate:.2%}, "
+                f"tokens per main model forward: {self.speedup:.2f}{tokens_per_second}"
+            )
@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SpeechChunk:
+    """
+    Audio sent by the VAD while the user is still speaking, for handlers able to process speech incrementally.
+    `offset` is the position of the chunk in the current utterance, in samples: a chunk with offset 0 starts a new utterance.
+    The complete utterance is still sent as a numpy array once the end of speech is detected.
+    """
+
+    audio: np.ndarray
+    offset: int
+
+
+@dataclass
+class SpeechStarted:
+    """
+    Sent by the VAD to the language model as soon as the user starts speaking, so that it can prepare the turn
+    (e.g. prefill the conversation history) while the speech is being transcribed.
+    """
+
+
+@dataclass
+class PartialTranscript:
+    """
+    Stable beginning of the transcript of the current utterance, sent by streaming STT handlers while the user is
+    still speaking. It is only a hint: the final transcript is still sent as text once the end of speech is detected.
+    """
+
+    text: str
@@ -0,0 +1,19 @@
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_dynamic_int8(model, device):
+    """
+    Applies dynamic int8 quantization to the linear layers of the model: weights are stored in int8 and
+    activations are quantized on the fly. PyTorch only provides these kernels on CPU, hence the model is
+    returned unchanged on other devices.
+    """
+    if device != "cpu":
+        logger.warning(f"Dynamic int8 quantization is only supported on CPU, keeping the weights of the model on {device}.")
+        return model
+    return torch.ao.quantization.quantize_dynamic(
+        model.float(), {torch.nn.Linear}, dtype=torch.qint8
+    )
@@ -0,0 +1,42 @@
+from threading import Lock
+
+
+class SpeakingRate:
+    """
+    Running estimate of the seconds of speech per character of text, measured on the audio produced by the TTS and
+    shared with the language model so that it can convert a duration of speech into an amount of text.
+    """
+
+    def __init__(self, seconds_per_char=0.065, smoothing=0.2):
+        self.seconds_per_char = seconds_per_char
+        self.smoothing = smoothing
+        self.lock = Lock()
+
+    def update(self, text, duration_s):
+        n_chars = len(text.strip())
+        if n_chars == 0 or duration_s <= 0:
+            return
+        with self.lock:
+            self.seconds_per_char += self.smoothing * (duration_s / n_chars - self.seconds_per_char)
+
+    def duration(self, text):
+        """
+        Estimated duration (s) of text once spoken.
+        """
+        return self.chars_duration(len(text.strip()))
+
+    def chars_duration(self, n_chars):
+        return n_chars * self.seconds_per_char
+
+
+def measure_speech(speaking_rate, llm_sentence, audio_chunks, sample_rate=16000):
+    """
+    Yields the audio chunks synthesized for llm_sentence, then records their duration in speaking_rate, if any.
+    """
+    text = llm_sentence[0] if isinstance(llm_sentence, tuple) else llm_sentence
+    n_samples = 0
+    for audio_chunk in audio_chunks:
+        n_samples += len(audio_chunk)
+        yield audio_chunk
+    if speaking_rate is not None:
+        speaking_rate.update(text, n_samples / sample_rate)